@@ -0,0 +1,61 @@
+"""
+Signed analysis tokens — /analyze results reused by /commit and /cancel.
+
+/analyze returns the impulse score it computed inside a short-lived,
+HMAC-signed token bound to the user, the transaction inputs and the user's
+data version. /commit and /cancel accept the token instead of reloading
+features and moods and scoring again. A token that is forged, expired, for
+different inputs or older than the user's latest write is simply ignored
+and the score recomputed.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from typing import Optional
+
+# Without VIBESHIELD_SECRET every process signs with its own random key, so a
+# token only verifies on the worker that issued it (others just recompute)
+SECRET = os.environ.get("VIBESHIELD_SECRET", "").encode() or secrets.token_bytes(32)
+
+TOKEN_TTL_S = float(os.environ.get("VIBESHIELD_ANALYSIS_TTL_S", "600"))
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _sign(body: str) -> str:
+    return _b64(hmac.new(SECRET, body.encode(), hashlib.sha256).digest())
+
+
+def issue(user_id: str, inputs: list, score: float, risk: str, data_version: int) -> str:
+    """Token for ``score``/``risk`` as computed from ``inputs`` at ``data_version``."""
+    body = _b64(json.dumps({
+        "u": user_id, "i": inputs, "s": score, "r": risk, "v": data_version,
+        "e": int(time.time() + TOKEN_TTL_S),
+    }, separators=(",", ":")).encode())
+    return f"{body}.{_sign(body)}"
+
+
+def verify(token: str, user_id: str, inputs: list) -> Optional[dict]:
+    """Claims of a genuine, unexpired token for this user and inputs, else None.
+
+    The caller still has to compare ``claims["v"]`` with the current data version.
+    """
+    body, _, sig = token.partition(".")
+    # Compare bytes: compare_digest rejects non-ASCII str with TypeError
+    if not sig or not hmac.compare_digest(sig.encode(), _sign(body).encode()):
+        return None
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(body + "=" * (-len(body) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(claims, dict):
+        return None
+    if claims.get("u") != user_id or claims.get("i") != inputs or claims.get("e", 0) < time.time():
+        return None
+    return claims
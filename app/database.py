@@ -2,8 +2,18 @@
 Database layer — SQLite with per-user data isolation.
 Every table has user_id so each user gets their own experience.
 """
-import sqlite3, os
+import asyncio, functools, glob, sqlite3, os, queue, threading, time, zlib
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Optional
+
+from app.ml.feature_state import FEATURE_WINDOW, FeatureState
+from app.ml.history import HISTORY_COLUMNS, UserHistory
+from app.ml.online_model import ONLINE_ENABLED, OnlineLogit
+from app.timefields import time_columns
 
 # On Vercel (serverless), filesystem is read-only except /tmp
 if os.environ.get("VERCEL"):
@@ -11,118 +21,942 @@ if os.environ.get("VERCEL"):
 else:
     DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "vibeshield.db")
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
+# Max open connections per database file
+POOL_SIZE = int(os.environ.get("VIBESHIELD_DB_POOL_SIZE", "8"))
+
+# Optional sharding: users are hashed across N database files (1 = single file)
+DB_SHARDS = int(os.environ.get("VIBESHIELD_DB_SHARDS", "1"))
+
+# Optional group commit: single-row writes are queued and committed together,
+# one transaction per WRITE_QUEUE_MAX_DELAY_MS or WRITE_QUEUE_MAX_BATCH ops
+WRITE_QUEUE = os.environ.get("VIBESHIELD_WRITE_QUEUE", "0").lower() in ("1", "true", "yes", "on")
+WRITE_QUEUE_MAX_DELAY_MS = float(os.environ.get("VIBESHIELD_WRITE_QUEUE_DELAY_MS", "3"))
+WRITE_QUEUE_MAX_BATCH = int(os.environ.get("VIBESHIELD_WRITE_QUEUE_BATCH", "64"))
+
+# FULL fsyncs the WAL on every commit, so a commit survives power loss.
+# NORMAL skips that fsync (WAL stays consistent, but the last commits can be
+# lost on power failure) — opt in only where that trade is acceptable.
+DB_SYNCHRONOUS = os.environ.get("VIBESHIELD_DB_SYNCHRONOUS", "FULL").upper()
+if DB_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+    raise ValueError(f"VIBESHIELD_DB_SYNCHRONOUS must be OFF, NORMAL, FULL or EXTRA, not {DB_SYNCHRONOUS!r}")
+
+# Applied once when a pooled connection is opened, not on every checkout
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    f"PRAGMA synchronous={DB_SYNCHRONOUS}",
+    "PRAGMA cache_size=-16000",       # ~16 MB page cache per connection
+    "PRAGMA mmap_size=134217728",     # 128 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
+    for pragma in _PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+
+class ConnectionPool:
+    """Bounded pool of long-lived, pre-configured connections to one DB file.
+
+    Connections are opened lazily up to ``size``; callers beyond that block
+    until one is released. Idle connections are health-checked on checkout
+    and replaced if they have gone bad. An optional ``prepare(conn)`` hook
+    (the schema check) runs once, before the first connection is handed out.
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE, prepare=None):
+        self.path = path
+        self.size = size
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+        self._prepare = prepare
+        self._prepared = prepare is None
+        self._prepare_lock = threading.Lock()
+
+    def prepare(self):
+        """Run the ``prepare`` hook now if it has not run yet."""
+        if self._prepared:
+            return
+        with self._prepare_lock:
+            if self._prepared:
+                return
+            conn = self._checkout()
+            broken = False
+            try:
+                self._prepare(conn)
+            except Exception:
+                broken = True
+                raise
+            finally:
+                self.release(conn, broken)
+            self._prepared = True
+
+    def acquire(self) -> sqlite3.Connection:
+        if not self._prepared:
+            self.prepare()
+        return self._checkout()
+
+    def _checkout(self) -> sqlite3.Connection:
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return _connect(self.path)
+                if self._healthy(conn):
+                    return conn
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn: sqlite3.Connection, broken: bool = False):
+        try:
+            if broken or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close every idle connection; checked-out ones close on release."""
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    @staticmethod
+    def _healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    @staticmethod
+    def _discard(conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def shard_path(user_id: str, shards: int = None) -> str:
+    """Database file that holds ``user_id``'s rows under ``shards`` shards."""
+    shards = DB_SHARDS if shards is None else shards
+    if shards <= 1:
+        return DB_PATH
+    base, ext = os.path.splitext(DB_PATH)
+    return f"{base}.shard{zlib.crc32(user_id.encode()) % shards}{ext}"
+
+
+def shard_paths(shards: int = None) -> list[str]:
+    """Every database file in use under ``shards`` shards."""
+    shards = DB_SHARDS if shards is None else shards
+    if shards <= 1:
+        return [DB_PATH]
+    base, ext = os.path.splitext(DB_PATH)
+    return [f"{base}.shard{i}{ext}" for i in range(shards)]
+
+
+def _get_pool(path: str = None) -> ConnectionPool:
+    path = path or DB_PATH
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path, prepare=_migrate)
+    return pool
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _pools_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=POOL_SIZE * max(1, DB_SHARDS),
+                                               thread_name_prefix="vibeshield-db")
+    return _executor
+
+
+async def run(fn, *args, **kwargs):
+    """Await a blocking database call on the DB executor.
+
+    The async routers go through this so a slow query never stalls the
+    event loop. The executor has one thread per pooled connection.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def close_db():
+    """Flush the write queues, then close all pooled connections and the DB
+    executor (called on app shutdown)."""
+    global _executor
+    with _pools_lock:
+        queues = list(_write_queues.values())
+        _write_queues.clear()
+    for wq in queues:
+        wq.close()
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    for pool in pools:
+        pool.close()
+
+
+def get_db():
+    """Open a standalone connection (not pooled) — caller must close it."""
+    return _connect(DB_PATH)
+
 @contextmanager
-def get_db_context():
-    conn = get_db()
+def get_db_context(user_id: str = None, path: str = None):
+    """Pooled connection for ``user_id``'s shard (or an explicit file).
+
+    Commits on success, rolls back on error.
+    """
+    pool = _get_pool(path or (shard_path(user_id) if user_id is not None else DB_PATH))
+    conn = pool.acquire()
+    broken = False
     try:
         yield conn
         conn.commit()
     except Exception:
-        conn.rollback()
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            broken = True
         raise
     finally:
-        conn.close()
+        pool.release(conn, broken)
+
+
+# ─────────────────── Group Commit ───────────────────
+
+class WriteQueue:
+    """Write-behind queue for one DB file with group commit.
+
+    A single writer thread drains the queue and runs everything that
+    arrives within ``max_delay_ms`` of the first op (up to ``max_batch``
+    ops) in one transaction, so a burst pays for one commit instead of
+    one per request. Each op runs under its own SAVEPOINT: a failing op
+    is rolled back alone and its caller gets the exception. Futures are
+    resolved only after the batch has committed.
+    """
+
+    def __init__(self, path: str, max_delay_ms: float = WRITE_QUEUE_MAX_DELAY_MS,
+                 max_batch: int = WRITE_QUEUE_MAX_BATCH):
+        self.path = path
+        self.max_delay = max_delay_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue: queue.Queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = self._ops = self._failed = self._max_size = self._last_size = 0
+        self._commit_ms = self._last_commit_ms = 0.0
+        self._thread = threading.Thread(target=self._loop, name="vibeshield-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, op, *args) -> Future:
+        """Queue ``op(conn, *args)``; the future holds its return value."""
+        fut: Future = Future()
+        self._queue.put((fut, op, args))
+        return fut
+
+    def close(self):
+        """Commit everything already queued, then stop the writer."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "depth": self._queue.qsize(),
+                "batches": self._batches,
+                "ops": self._ops,
+                "failed_ops": self._failed,
+                "avg_batch_size": round(self._ops / self._batches, 2) if self._batches else 0,
+                "max_batch_size": self._max_size,
+                "last_batch_size": self._last_size,
+                "avg_commit_ms": round(self._commit_ms / self._batches, 3) if self._batches else 0,
+                "last_commit_ms": round(self._last_commit_ms, 3),
+            }
+
+    def _loop(self):
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch: list):
+        started = time.perf_counter()
+        outcomes = []
+        pool = _get_pool(self.path)
+        try:
+            conn = pool.acquire()
+        except Exception as e:
+            for fut, _, _ in batch:
+                fut.set_exception(e)
+            return
+        broken = False
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fut, op, args in batch:
+                conn.execute("SAVEPOINT queued_op")
+                try:
+                    outcomes.append((fut, op(conn, *args), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO queued_op")
+                    outcomes.append((fut, None, e))
+                conn.execute("RELEASE queued_op")
+            conn.commit()
+        except Exception as e:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                broken = True
+            outcomes = [(fut, None, e) for fut, _, _ in batch]
+        finally:
+            pool.release(conn, broken)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._batches += 1
+            self._ops += len(batch)
+            self._failed += sum(1 for _, _, err in outcomes if err is not None)
+            self._max_size = max(self._max_size, len(batch))
+            self._last_size = len(batch)
+            self._commit_ms += elapsed_ms
+            self._last_commit_ms = elapsed_ms
+        for fut, result, err in outcomes:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(result)
+
+
+_write_queues: dict[str, WriteQueue] = {}
+
+
+def _get_write_queue(path: str) -> WriteQueue:
+    wq = _write_queues.get(path)
+    if wq is None:
+        with _pools_lock:
+            wq = _write_queues.get(path)
+            if wq is None:
+                wq = _write_queues[path] = WriteQueue(path)
+    return wq
+
+
+def _write(user_id: str, op, *args):
+    """Run ``op(conn, *args)`` as a write for ``user_id``.
+
+    Goes through the shard's group-commit queue when VIBESHIELD_WRITE_QUEUE
+    is on (blocking until the batch has committed), otherwise commits in
+    its own transaction.
+    """
+    if WRITE_QUEUE:
+        return _get_write_queue(shard_path(user_id)).submit(op, *args).result()
+    with get_db_context(user_id) as c:
+        return op(c, *args)
+
+
+def write_queue_stats() -> dict:
+    """Queue depth and batch sizes per DB file (empty when the queue is off)."""
+    return {
+        "enabled": WRITE_QUEUE,
+        "max_delay_ms": WRITE_QUEUE_MAX_DELAY_MS,
+        "max_batch": WRITE_QUEUE_MAX_BATCH,
+        "queues": {os.path.basename(path): wq.stats() for path, wq in list(_write_queues.items())},
+    }
 
 def _row(r):
     return dict(r) if r else None
 
+# ─────────────────── Schema Migrations ───────────────────
+#
+# Each migration runs once, in order, inside its own write transaction and
+# bumps PRAGMA user_version. Migrations must never drop user data.
+
+_LEGACY_USER_TABLES = ("transactions", "moods", "savings_goals", "accountability_contacts")
+
+
+def _columns(c, table: str) -> set[str]:
+    return {r["name"] for r in c.execute(f"PRAGMA table_info({table})")}
+
+
+def _migrate_base_schema(c):
+    """v1 — base tables. Pre-user_id databases keep their rows under user ''."""
+    for tbl in _LEGACY_USER_TABLES:
+        cols = _columns(c, tbl)
+        if cols and "user_id" not in cols:
+            c.execute(f"ALTER TABLE {tbl} ADD COLUMN user_id TEXT NOT NULL DEFAULT ''")
+    for stmt in (
+        """CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            amount REAL NOT NULL,
+            merchant TEXT NOT NULL,
+            category TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            impulse_score REAL DEFAULT 0,
+            risk_level TEXT DEFAULT 'low',
+            was_paused INTEGER DEFAULT 0,
+            was_overridden INTEGER DEFAULT 0,
+            was_cancelled INTEGER DEFAULT 0,
+            pause_duration REAL DEFAULT 0,
+            notes TEXT DEFAULT ''
+        )""",
+        """CREATE TABLE IF NOT EXISTS moods (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            mood TEXT NOT NULL,
+            emoji TEXT NOT NULL,
+            intensity INTEGER DEFAULT 5,
+            timestamp TEXT NOT NULL,
+            notes TEXT DEFAULT ''
+        )""",
+        """CREATE TABLE IF NOT EXISTS savings_goals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            target_amount REAL NOT NULL,
+            current_amount REAL DEFAULT 0,
+            deadline TEXT,
+            created_at TEXT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS accountability_contacts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            phone TEXT DEFAULT '',
+            email TEXT DEFAULT '',
+            is_active INTEGER DEFAULT 1
+        )""",
+        """CREATE TABLE IF NOT EXISTS user_settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL UNIQUE,
+            lock_duration INTEGER DEFAULT 20,
+            lock_sensitivity TEXT DEFAULT 'medium',
+            enable_accountability INTEGER DEFAULT 1,
+            enable_breathing INTEGER DEFAULT 1,
+            enable_mood_alerts INTEGER DEFAULT 1
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_tx_user ON transactions(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_mood_user ON moods(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_sg_user ON savings_goals(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_us_user ON user_settings(user_id)",
+    ):
+        c.execute(stmt)
+
+
+def _migrate_hot_path_indexes(c):
+    """v2 — composite indexes so per-user "newest first" reads never sort."""
+    for stmt in (
+        "CREATE INDEX IF NOT EXISTS idx_tx_user_ts ON transactions(user_id, timestamp DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_tx_user_cancelled_ts "
+        "ON transactions(user_id, was_cancelled, timestamp DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_mood_user_ts ON moods(user_id, timestamp DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_ac_user_active ON accountability_contacts(user_id, is_active)",
+        # Superseded by the composite indexes above (same leading column)
+        "DROP INDEX IF EXISTS idx_tx_user",
+        "DROP INDEX IF EXISTS idx_mood_user",
+    ):
+        c.execute(stmt)
+
+
+_TIME_COLUMNS = ("epoch_us", "hour", "weekday", "day_num")
+
+
+def _migrate_time_columns(c):
+    """v3 — integer epoch + wall-clock hour/weekday/day on transactions and moods."""
+    for tbl in ("transactions", "moods"):
+        cols = _columns(c, tbl)
+        for col in _TIME_COLUMNS:
+            if col not in cols:
+                c.execute(f"ALTER TABLE {tbl} ADD COLUMN {col} INTEGER")
+        rows = c.execute(f"SELECT id, timestamp FROM {tbl} WHERE epoch_us IS NULL").fetchall()
+        c.executemany(
+            f"UPDATE {tbl} SET epoch_us=?, hour=?, weekday=?, day_num=? WHERE id=?",
+            ((*time_columns(r["timestamp"]), r["id"]) for r in rows))
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tx_user_epoch ON transactions(user_id, epoch_us)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_mood_user_epoch ON moods(user_id, epoch_us)")
+
+
+def _migrate_rollups(c):
+    """v4 — rollup tables, filled from the existing rows."""
+    for stmt in (
+        """CREATE TABLE IF NOT EXISTS rollup_user (
+            user_id TEXT PRIMARY KEY,
+            tx_count INTEGER NOT NULL DEFAULT 0,
+            committed_count INTEGER NOT NULL DEFAULT 0,
+            committed_amount REAL NOT NULL DEFAULT 0,
+            committed_score_sum REAL NOT NULL DEFAULT 0,
+            cancelled_count INTEGER NOT NULL DEFAULT 0,
+            cancelled_amount REAL NOT NULL DEFAULT 0,
+            high_risk_count INTEGER NOT NULL DEFAULT 0,
+            mood_count INTEGER NOT NULL DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS rollup_daily (
+            user_id TEXT NOT NULL,
+            day TEXT NOT NULL,
+            committed_amount REAL NOT NULL DEFAULT 0,
+            committed_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS rollup_category (
+            user_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            committed_amount REAL NOT NULL DEFAULT 0,
+            committed_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, category)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS rollup_hour (
+            user_id TEXT NOT NULL,
+            weekday INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            amount REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, weekday, hour)
+        ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS rollup_cat_hour (
+            user_id TEXT NOT NULL,
+            category TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            amount REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, category, hour)
+        ) WITHOUT ROWID""",
+    ):
+        c.execute(stmt)
+    _rebuild_rollups(c)
+
+
+def _migrate_online_models(c):
+    """v5 — per-user state of the online impulse model (app.ml.online_model)."""
+    c.execute("""CREATE TABLE IF NOT EXISTS online_models (
+        user_id TEXT PRIMARY KEY,
+        state TEXT NOT NULL
+    )""")
+
+
+def _migrate_user_versions(c):
+    """v6 — per-user data version, bumped by every write (see _bump_data_version)."""
+    c.execute("""CREATE TABLE IF NOT EXISTS user_versions (
+        user_id TEXT PRIMARY KEY,
+        version INTEGER NOT NULL
+    )""")
+
+
+def _migrate_committed_epoch_index(c):
+    """v7 — committed transactions newest first by epoch (iter_transactions)."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tx_user_cancelled_epoch "
+              "ON transactions(user_id, was_cancelled, epoch_us)")
+
+
+MIGRATIONS = [
+    (1, _migrate_base_schema),
+    (2, _migrate_hot_path_indexes),
+    (3, _migrate_time_columns),
+    (4, _migrate_rollups),
+    (5, _migrate_online_models),
+    (6, _migrate_user_versions),
+    (7, _migrate_committed_epoch_index),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def _migrate(c):
+    """Pool ``prepare`` hook: a single PRAGMA read when the file is current."""
+    if c.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    for version, migrate in MIGRATIONS:
+        c.execute("BEGIN IMMEDIATE")
+        # Re-read under the write lock: another worker may have migrated
+        if c.execute("PRAGMA user_version").fetchone()[0] < version:
+            migrate(c)
+            c.execute(f"PRAGMA user_version={version}")
+        c.commit()
+
+
 def init_db():
-    with get_db_context() as c:
-        # Check if old schema (no user_id) — if so, drop and recreate
-        needs_migration = False
-        try:
-            c.execute("SELECT user_id FROM transactions LIMIT 0")
-        except Exception:
-            needs_migration = True
-        if needs_migration:
-            c.executescript("""
-                DROP TABLE IF EXISTS transactions;
-                DROP TABLE IF EXISTS moods;
-                DROP TABLE IF EXISTS savings_goals;
-                DROP TABLE IF EXISTS accountability_contacts;
-            """)
-        c.executescript("""
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                amount REAL NOT NULL,
-                merchant TEXT NOT NULL,
-                category TEXT NOT NULL,
-                timestamp TEXT NOT NULL,
-                impulse_score REAL DEFAULT 0,
-                risk_level TEXT DEFAULT 'low',
-                was_paused INTEGER DEFAULT 0,
-                was_overridden INTEGER DEFAULT 0,
-                was_cancelled INTEGER DEFAULT 0,
-                pause_duration REAL DEFAULT 0,
-                notes TEXT DEFAULT ''
-            );
-            CREATE TABLE IF NOT EXISTS moods (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                mood TEXT NOT NULL,
-                emoji TEXT NOT NULL,
-                intensity INTEGER DEFAULT 5,
-                timestamp TEXT NOT NULL,
-                notes TEXT DEFAULT ''
-            );
-            CREATE TABLE IF NOT EXISTS savings_goals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                name TEXT NOT NULL,
-                target_amount REAL NOT NULL,
-                current_amount REAL DEFAULT 0,
-                deadline TEXT,
-                created_at TEXT NOT NULL
-            );
-            CREATE TABLE IF NOT EXISTS accountability_contacts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                name TEXT NOT NULL,
-                phone TEXT DEFAULT '',
-                email TEXT DEFAULT '',
-                is_active INTEGER DEFAULT 1
-            );
-            CREATE TABLE IF NOT EXISTS user_settings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL UNIQUE,
-                lock_duration INTEGER DEFAULT 20,
-                lock_sensitivity TEXT DEFAULT 'medium',
-                enable_accountability INTEGER DEFAULT 1,
-                enable_breathing INTEGER DEFAULT 1,
-                enable_mood_alerts INTEGER DEFAULT 1
-            );
-            CREATE INDEX IF NOT EXISTS idx_tx_user ON transactions(user_id);
-            CREATE INDEX IF NOT EXISTS idx_mood_user ON moods(user_id);
-            CREATE INDEX IF NOT EXISTS idx_sg_user ON savings_goals(user_id);
-            CREATE INDEX IF NOT EXISTS idx_us_user ON user_settings(user_id);
-        """)
+    """Bring every shard up to SCHEMA_VERSION, one migration per transaction.
+
+    Optional: each file is also checked on its pool's first checkout, which
+    is what fast-start mode (VIBESHIELD_FAST_START) relies on.
+    """
+    for path in shard_paths():
+        _get_pool(path).prepare()
+
+
+# ─────────────────── Rollups ───────────────────
+#
+# Per-user aggregates kept in step with the raw rows: every write to
+# transactions or moods updates them inside the same transaction, so the
+# dashboard and trigger map read O(cells) instead of scanning history.
+
+_ROLLUP_TABLES = ("rollup_user", "rollup_daily", "rollup_category", "rollup_hour", "rollup_cat_hour")
+
+
+def _rollup_transactions(c, user_id: str, rows, sign: int = 1):
+    """Add (sign=1) or retract (sign=-1) transaction rows in the user's rollups."""
+    user = [0, 0, 0.0, 0.0, 0, 0.0, 0]
+    daily: dict[str, list] = defaultdict(lambda: [0.0, 0])
+    cats: dict[str, list] = defaultdict(lambda: [0.0, 0, 0.0, 0])
+    hours: dict[tuple, list] = defaultdict(lambda: [0.0, 0])
+    cat_hours: dict[tuple, list] = defaultdict(lambda: [0.0, 0])
+    for t in rows:
+        amount = t["amount"] * sign
+        score = t.get("impulse_score") or 0
+        cat = cats[t["category"]]
+        user[0] += sign
+        cat[0] += amount
+        cat[1] += sign
+        if t.get("was_cancelled"):
+            user[4] += sign
+            user[5] += amount
+        else:
+            user[1] += sign
+            user[2] += amount
+            user[3] += score * sign
+            cat[2] += amount
+            cat[3] += sign
+            day = daily[t["timestamp"][:10]]
+            day[0] += amount
+            day[1] += sign
+        if score >= 55:
+            user[6] += sign
+        if t.get("hour") is not None:
+            cell = hours[(t["weekday"], t["hour"])]
+            cell[0] += amount
+            cell[1] += sign
+            cell = cat_hours[(t["category"], t["hour"])]
+            cell[0] += amount
+            cell[1] += sign
+    c.execute(
+        """INSERT INTO rollup_user (user_id, tx_count, committed_count, committed_amount,
+               committed_score_sum, cancelled_count, cancelled_amount, high_risk_count)
+           VALUES (?,?,?,?,?,?,?,?)
+           ON CONFLICT(user_id) DO UPDATE SET
+               tx_count = tx_count + excluded.tx_count,
+               committed_count = committed_count + excluded.committed_count,
+               committed_amount = committed_amount + excluded.committed_amount,
+               committed_score_sum = committed_score_sum + excluded.committed_score_sum,
+               cancelled_count = cancelled_count + excluded.cancelled_count,
+               cancelled_amount = cancelled_amount + excluded.cancelled_amount,
+               high_risk_count = high_risk_count + excluded.high_risk_count""",
+        (user_id, *user))
+    c.executemany(
+        """INSERT INTO rollup_daily (user_id, day, committed_amount, committed_count) VALUES (?,?,?,?)
+           ON CONFLICT(user_id, day) DO UPDATE SET
+               committed_amount = committed_amount + excluded.committed_amount,
+               committed_count = committed_count + excluded.committed_count""",
+        ((user_id, day, *v) for day, v in daily.items() if v[1]))
+    c.executemany(
+        """INSERT INTO rollup_category (user_id, category, amount, count, committed_amount, committed_count)
+           VALUES (?,?,?,?,?,?)
+           ON CONFLICT(user_id, category) DO UPDATE SET
+               amount = amount + excluded.amount,
+               count = count + excluded.count,
+               committed_amount = committed_amount + excluded.committed_amount,
+               committed_count = committed_count + excluded.committed_count""",
+        ((user_id, cat, *v) for cat, v in cats.items()))
+    c.executemany(
+        """INSERT INTO rollup_hour (user_id, weekday, hour, amount, count) VALUES (?,?,?,?,?)
+           ON CONFLICT(user_id, weekday, hour) DO UPDATE SET
+               amount = amount + excluded.amount, count = count + excluded.count""",
+        ((user_id, wd, h, *v) for (wd, h), v in hours.items()))
+    c.executemany(
+        """INSERT INTO rollup_cat_hour (user_id, category, hour, amount, count) VALUES (?,?,?,?,?)
+           ON CONFLICT(user_id, category, hour) DO UPDATE SET
+               amount = amount + excluded.amount, count = count + excluded.count""",
+        ((user_id, cat, h, *v) for (cat, h), v in cat_hours.items()))
+
+
+def _rollup_moods(c, user_id: str, n: int):
+    c.execute(
+        """INSERT INTO rollup_user (user_id, mood_count) VALUES (?,?)
+           ON CONFLICT(user_id) DO UPDATE SET mood_count = mood_count + excluded.mood_count""",
+        (user_id, n))
+
+
+def _rebuild_rollups(c, user_id: str = None):
+    """Recompute rollups from the raw rows (all users if user_id is None)."""
+    where, args = ("WHERE user_id=?", (user_id,)) if user_id else ("WHERE 1", ())
+    for tbl in _ROLLUP_TABLES:
+        c.execute(f"DELETE FROM {tbl} {where}", args)
+    c.execute(f"""INSERT INTO rollup_user (user_id, tx_count, committed_count, committed_amount,
+                      committed_score_sum, cancelled_count, cancelled_amount, high_risk_count)
+                  SELECT user_id, COUNT(*), SUM(was_cancelled=0),
+                         TOTAL(CASE WHEN was_cancelled=0 THEN amount END),
+                         TOTAL(CASE WHEN was_cancelled=0 THEN impulse_score END),
+                         SUM(was_cancelled=1), TOTAL(CASE WHEN was_cancelled=1 THEN amount END),
+                         SUM(COALESCE(impulse_score, 0) >= 55)
+                  FROM transactions {where} GROUP BY user_id""", args)
+    c.execute(f"""INSERT INTO rollup_user (user_id, mood_count)
+                  SELECT user_id, COUNT(*) FROM moods {where} GROUP BY user_id
+                  ON CONFLICT(user_id) DO UPDATE SET mood_count = excluded.mood_count""", args)
+    c.execute(f"""INSERT INTO rollup_daily (user_id, day, committed_amount, committed_count)
+                  SELECT user_id, substr(timestamp, 1, 10), TOTAL(amount), COUNT(*)
+                  FROM transactions {where} AND was_cancelled=0 GROUP BY 1, 2""", args)
+    c.execute(f"""INSERT INTO rollup_category (user_id, category, amount, count,
+                      committed_amount, committed_count)
+                  SELECT user_id, category, TOTAL(amount), COUNT(*),
+                         TOTAL(CASE WHEN was_cancelled=0 THEN amount END), SUM(was_cancelled=0)
+                  FROM transactions {where} GROUP BY 1, 2""", args)
+    c.execute(f"""INSERT INTO rollup_hour (user_id, weekday, hour, amount, count)
+                  SELECT user_id, weekday, hour, TOTAL(amount), COUNT(*)
+                  FROM transactions {where} AND hour IS NOT NULL GROUP BY 1, 2, 3""", args)
+    c.execute(f"""INSERT INTO rollup_cat_hour (user_id, category, hour, amount, count)
+                  SELECT user_id, category, hour, TOTAL(amount), COUNT(*)
+                  FROM transactions {where} AND hour IS NOT NULL GROUP BY 1, 2, 3""", args)
+
+
+def rebuild_rollups(user_id: str = None):
+    """Rebuild rollups from raw rows — for consistency checks and repairs."""
+    paths = [shard_path(user_id)] if user_id else shard_paths()
+    for path in paths:
+        with get_db_context(path=path) as c:
+            c.execute("BEGIN IMMEDIATE")
+            _rebuild_rollups(c, user_id)
+
+
+# ─────────────────── Data Version ───────────────────
+#
+# A per-user counter bumped inside every write transaction. Anything derived
+# from a user's data (e.g. a signed /analyze result) can record the version
+# it saw and later check, with one PK lookup, that nothing has changed since.
+# It is never reset, not even by clear_user_data().
+
+def _bump_data_version(c, user_id: str):
+    c.execute("""INSERT INTO user_versions (user_id, version) VALUES (?, 1)
+                 ON CONFLICT(user_id) DO UPDATE SET version = version + 1""", (user_id,))
+
+def _data_version(c, user_id: str) -> int:
+    r = c.execute("SELECT version FROM user_versions WHERE user_id=?", (user_id,)).fetchone()
+    return r[0] if r else 0
+
+def get_data_version(user_id: str) -> int:
+    with get_db_context(user_id) as c:
+        return _data_version(c, user_id)
+
+
+# ─────────────────── Online Model ───────────────────
+# With VIBESHIELD_ML_MODEL=online every inserted transaction is one O(1)
+# learning step, applied in the same write transaction as the insert.
+
+def _load_online_model(c, user_id: str) -> Optional[OnlineLogit]:
+    r = c.execute("SELECT state FROM online_models WHERE user_id=?", (user_id,)).fetchone()
+    return OnlineLogit.loads(r["state"]) if r else None
+
+def _learn_online(c, user_id: str, rows):
+    from app.ml.impulse_engine import online_sample
+    model = _load_online_model(c, user_id) or OnlineLogit()
+    for r in rows:
+        if r["hour"] is not None:
+            model.update(*online_sample(r["hour"], r["weekday"], r["amount"], r["category"],
+                                        r["impulse_score"]))
+    c.execute("""INSERT INTO online_models (user_id, state) VALUES (?, ?)
+                 ON CONFLICT(user_id) DO UPDATE SET state = excluded.state""",
+              (user_id, model.dumps()))
+
+def get_online_model(user_id: str) -> Optional[OnlineLogit]:
+    with get_db_context(user_id) as c:
+        return _load_online_model(c, user_id)
+
+def retrain_online_models(user_id: str = None):
+    """Replay history (oldest first) into fresh online models — for switching
+    an existing deployment to VIBESHIELD_ML_MODEL=online."""
+    paths = [shard_path(user_id)] if user_id else shard_paths()
+    for path in paths:
+        with get_db_context(path=path) as c:
+            c.execute("BEGIN IMMEDIATE")
+            where, args = ("WHERE user_id=?", (user_id,)) if user_id else ("", ())
+            c.execute(f"DELETE FROM online_models {where}", args)
+            users = [r["user_id"] for r in c.execute(
+                f"SELECT DISTINCT user_id FROM transactions {where}", args)]
+            for uid in users:
+                _learn_online(c, uid, (_row(r) for r in c.execute(
+                    "SELECT hour, weekday, amount, category, impulse_score FROM transactions "
+                    "WHERE user_id=? ORDER BY epoch_us, id", (uid,))))
+
+
+# ─────────────────── Feature State ───────────────────
+# In-process cache of each user's FeatureState (app.ml.feature_state),
+# rebuilt from the committed window on demand. Each state is tagged with the
+# user's data version it was built at and only served while the persisted
+# version still matches, so writes from other processes (or connections)
+# are never missed. A cached state is never mutated, since scoring reads it
+# without the lock: a committed insert is folded into a copy that replaces
+# it when it is the only write since the cached version.
+
+FEATURE_STATE_CACHE_SIZE = 1024
+
+_feature_states: "OrderedDict[str, tuple[FeatureState, int]]" = OrderedDict()   # user_id → (state, version)
+_feature_lock = threading.Lock()
+
+
+def _cached_feature_state(user_id: str, version: int) -> Optional[FeatureState]:
+    with _feature_lock:
+        entry = _feature_states.get(user_id)
+        if entry is None or entry[1] != version:
+            return None
+        _feature_states.move_to_end(user_id)
+        return entry[0]
+
+
+def _store_feature_state(user_id: str, version: int, state: FeatureState):
+    with _feature_lock:
+        entry = _feature_states.get(user_id)
+        if entry is not None and entry[1] > version:
+            return   # a rebuild that raced with a newer write
+        _feature_states[user_id] = (state, version)
+        _feature_states.move_to_end(user_id)
+        while len(_feature_states) > FEATURE_STATE_CACHE_SIZE:
+            _feature_states.popitem(last=False)
+
+
+def _observe_transaction(user_id: str, tx_id: int, row: dict, version: int):
+    """Fold a just-committed transaction (now at ``version``) into the cached state."""
+    with _feature_lock:
+        entry = _feature_states.get(user_id)
+        if entry is None or entry[1] != version - 1:
+            return   # not cached, or another write came in between: rebuilt on next read
+        state = entry[0]
+        if not row["was_cancelled"]:
+            state = state.copy()
+            if not state.add({**row, "id": tx_id}):
+                return
+        _feature_states[user_id] = (state, version)
+
+
+def _invalidate_feature_state(user_id: str):
+    with _feature_lock:
+        _feature_states.pop(user_id, None)
+
+
+def get_feature_state(user_id: str) -> FeatureState:
+    """The user's FeatureState, loading the committed window only when not cached."""
+    with get_db_context(user_id) as c:
+        version = _data_version(c, user_id)
+        state = _cached_feature_state(user_id, version)
+        if state is not None:
+            return state
+        c.execute("BEGIN")
+        version = _data_version(c, user_id)
+        rows = c.execute(
+            "SELECT * FROM transactions WHERE user_id=? AND was_cancelled=0 ORDER BY timestamp DESC LIMIT ?",
+            (user_id, FEATURE_WINDOW)).fetchall()
+    state = FeatureState.from_history([_row(r) for r in rows])
+    _store_feature_state(user_id, version, state)
+    return state
 
 
 # ─────────────────── Transactions ───────────────────
 
+_TX_INSERT_COLUMNS = ("amount", "merchant", "category", "timestamp", "impulse_score", "risk_level",
+                      "was_paused", "was_overridden", "was_cancelled", "notes",
+                      "epoch_us", "hour", "weekday", "day_num")
+_TX_INSERT_SQL = (f"INSERT INTO transactions (user_id, {', '.join(_TX_INSERT_COLUMNS)}) "
+                  f"VALUES ({', '.join('?' * (len(_TX_INSERT_COLUMNS) + 1))})")
+
+def _transaction_row(data: dict) -> dict:
+    epoch_us, hour, weekday, day_num = time_columns(data["timestamp"])
+    return {
+        "amount": data["amount"], "merchant": data["merchant"], "category": data["category"],
+        "timestamp": data["timestamp"], "impulse_score": data.get("impulse_score", 0),
+        "risk_level": data.get("risk_level", "low"), "was_paused": int(data.get("was_paused", 0)),
+        "was_overridden": int(data.get("was_overridden", 0)),
+        "was_cancelled": int(data.get("was_cancelled", 0)), "notes": data.get("notes", ""),
+        "epoch_us": epoch_us, "hour": hour, "weekday": weekday, "day_num": day_num,
+    }
+
+def _insert_transaction(c, user_id: str, row: dict) -> int:
+    cur = c.execute(_TX_INSERT_SQL, (user_id, *(row[k] for k in _TX_INSERT_COLUMNS)))
+    _rollup_transactions(c, user_id, [row])
+    _bump_data_version(c, user_id)
+    if ONLINE_ENABLED:
+        _learn_online(c, user_id, [row])
+    return cur.lastrowid, _data_version(c, user_id)
+
 def insert_transaction(user_id: str, data: dict) -> int:
-    with get_db_context() as c:
-        cur = c.execute(
-            """INSERT INTO transactions
-               (user_id, amount, merchant, category, timestamp,
-                impulse_score, risk_level, was_paused, was_overridden, was_cancelled, notes)
-               VALUES (?,?,?,?,?,?,?,?,?,?,?)""",
-            (user_id, data["amount"], data["merchant"], data["category"],
-             data["timestamp"], data.get("impulse_score", 0),
-             data.get("risk_level", "low"), int(data.get("was_paused", 0)),
-             int(data.get("was_overridden", 0)), int(data.get("was_cancelled", 0)),
-             data.get("notes", "")))
-        return cur.lastrowid
+    row = _transaction_row(data)
+    tx_id, version = _write(user_id, _insert_transaction, user_id, row)
+    _observe_transaction(user_id, tx_id, row, version)
+    return tx_id
+
+def _chunks(rows: Iterable, size: int):
+    it = iter(rows)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+def _insert_many(c, table: str, sql: str, params: list[tuple]) -> list[int]:
+    """executemany an AUTOINCREMENT insert and return the ids it assigned.
+
+    Inside a write transaction ids are handed out consecutively, so they
+    are the last len(params) values of the table's sqlite_sequence.
+    """
+    c.executemany(sql, params)
+    last = c.execute("SELECT seq FROM sqlite_sequence WHERE name=?", (table,)).fetchone()["seq"]
+    return list(range(last - len(params) + 1, last + 1))
+
+def insert_transactions_many(user_id: str, rows: Iterable[dict], chunk_size: int = 500) -> list[int]:
+    """Bulk insert_transaction(): one transaction, chunked executemany.
+
+    ``rows`` may be any iterable (including a generator); returns the new
+    ids in input order.
+    """
+    ids: list[int] = []
+    with get_db_context(user_id) as c:
+        c.execute("BEGIN IMMEDIATE")
+        for chunk in _chunks(rows, chunk_size):
+            chunk = [_transaction_row(d) for d in chunk]
+            ids += _insert_many(c, "transactions", _TX_INSERT_SQL,
+                                [(user_id, *(r[k] for k in _TX_INSERT_COLUMNS)) for r in chunk])
+            _rollup_transactions(c, user_id, chunk)
+            if ONLINE_ENABLED:
+                _learn_online(c, user_id, chunk)
+        _bump_data_version(c, user_id)
+    _invalidate_feature_state(user_id)
+    return ids
 
 def get_all_transactions(user_id: str, limit: int = 500) -> list[dict]:
-    with get_db_context() as c:
+    with get_db_context(user_id) as c:
         rows = c.execute(
             "SELECT * FROM transactions WHERE user_id=? ORDER BY timestamp DESC LIMIT ?",
             (user_id, limit)).fetchall()
@@ -130,44 +964,127 @@ def get_all_transactions(user_id: str, limit: int = 500) -> list[dict]:
 
 def get_committed_transactions(user_id: str, limit: int = 500) -> list[dict]:
     """Only transactions that went through (not cancelled)."""
-    with get_db_context() as c:
+    with get_db_context(user_id) as c:
         rows = c.execute(
             "SELECT * FROM transactions WHERE user_id=? AND was_cancelled=0 ORDER BY timestamp DESC LIMIT ?",
             (user_id, limit)).fetchall()
         return [_row(r) for r in rows]
 
+_HISTORY_SELECT = f"SELECT {', '.join(HISTORY_COLUMNS)} FROM transactions"
+
+def _tuple_cursor(c):
+    cur = c.cursor()
+    cur.row_factory = None
+    return cur
+
+def get_user_history(user_id: str, limit: int = 500, committed_only: bool = False) -> UserHistory:
+    """get_all_transactions() / get_committed_transactions() as a UserHistory (no row dicts)."""
+    committed = " AND was_cancelled=0" if committed_only else ""
+    with get_db_context(user_id) as c:
+        return UserHistory.from_cursor(_tuple_cursor(c).execute(
+            f"{_HISTORY_SELECT} WHERE user_id=?{committed} ORDER BY timestamp DESC LIMIT ?",
+            (user_id, limit)))
+
+def _iter_rows(user_id: str, sql: str, params: tuple, chunk_size: int):
+    """Yield row dicts of ``sql`` fetched ``chunk_size`` at a time.
+
+    One pooled connection is held until the generator is exhausted or
+    closed, so consume it in one go (e.g. inside a single db.run call).
+    """
+    with get_db_context(user_id) as c:
+        cur = c.execute(sql, params)
+        try:
+            while rows := cur.fetchmany(chunk_size):
+                for r in rows:
+                    yield dict(r)
+        finally:
+            cur.close()
+
+def iter_transactions(user_id: str, committed_only: bool = False, chunk_size: int = 500):
+    """Every transaction of the user, newest first by epoch_us, in bounded memory.
+
+    Unlike get_all_transactions() nothing is truncated, and rows are in true
+    time order even when their timestamps carry different UTC offsets (the
+    ISO strings then do not sort chronologically). Ties go by id, newest
+    first; rows without a usable time (epoch_us NULL) come last.
+    """
+    committed = " AND was_cancelled=0" if committed_only else ""
+    return _iter_rows(user_id,
+                      f"SELECT * FROM transactions WHERE user_id=?{committed} "
+                      "ORDER BY epoch_us DESC, id DESC",
+                      (user_id,), chunk_size)
+
 def get_transaction_count(user_id: str) -> int:
-    with get_db_context() as c:
-        r = c.execute("SELECT COUNT(*) as cnt FROM transactions WHERE user_id=?", (user_id,)).fetchone()
-        return r["cnt"] if r else 0
+    with get_db_context(user_id) as c:
+        return _user_rollup(c, user_id)["tx_count"]
 
-def update_transaction_outcome(tx_id: int, was_paused: bool, was_overridden: bool,
+def _update_transaction_outcome(c, user_id: str, tx_id: int, was_paused: bool, was_overridden: bool,
+                                was_cancelled: bool, pause_duration: float):
+    old = _row(c.execute("SELECT * FROM transactions WHERE id=? AND user_id=?",
+                         (tx_id, user_id)).fetchone())
+    if not old:
+        return False
+    c.execute(
+        "UPDATE transactions SET was_paused=?, was_overridden=?, was_cancelled=?, pause_duration=? WHERE id=?",
+        (int(was_paused), int(was_overridden), int(was_cancelled), pause_duration, tx_id))
+    _bump_data_version(c, user_id)
+    if bool(old["was_cancelled"]) == bool(was_cancelled):
+        return False
+    _rollup_transactions(c, user_id, [old], sign=-1)
+    _rollup_transactions(c, user_id, [{**old, "was_cancelled": int(was_cancelled)}])
+    return True
+
+def update_transaction_outcome(user_id: str, tx_id: int, was_paused: bool, was_overridden: bool,
                                 was_cancelled: bool, pause_duration: float = 0):
-    with get_db_context() as c:
-        c.execute(
-            "UPDATE transactions SET was_paused=?, was_overridden=?, was_cancelled=?, pause_duration=? WHERE id=?",
-            (int(was_paused), int(was_overridden), int(was_cancelled), pause_duration, tx_id))
+    if _write(user_id, _update_transaction_outcome, user_id, tx_id,
+              was_paused, was_overridden, was_cancelled, pause_duration):
+        _invalidate_feature_state(user_id)
 
 
 # ─────────────────── Moods ───────────────────
 
+_MOOD_INSERT_SQL = """INSERT INTO moods
+    (user_id, mood, emoji, intensity, timestamp, notes, epoch_us, hour, weekday, day_num)
+    VALUES (?,?,?,?,?,?,?,?,?,?)"""
+
+def _mood_params(user_id: str, data: dict) -> tuple:
+    return (user_id, data["mood"], data["emoji"], data.get("intensity", 5),
+            data["timestamp"], data.get("notes", ""), *time_columns(data["timestamp"]))
+
+def _insert_mood(c, user_id: str, params: tuple) -> int:
+    cur = c.execute(_MOOD_INSERT_SQL, params)
+    _rollup_moods(c, user_id, 1)
+    _bump_data_version(c, user_id)
+    return cur.lastrowid
+
 def insert_mood(user_id: str, data: dict) -> int:
-    with get_db_context() as c:
-        cur = c.execute(
-            "INSERT INTO moods (user_id, mood, emoji, intensity, timestamp, notes) VALUES (?,?,?,?,?,?)",
-            (user_id, data["mood"], data["emoji"], data.get("intensity", 5),
-             data["timestamp"], data.get("notes", "")))
-        return cur.lastrowid
+    return _write(user_id, _insert_mood, user_id, _mood_params(user_id, data))
+
+def insert_moods_many(user_id: str, rows: Iterable[dict], chunk_size: int = 500) -> list[int]:
+    """Bulk insert_mood(): one transaction, chunked executemany; returns ids in order."""
+    ids: list[int] = []
+    with get_db_context(user_id) as c:
+        c.execute("BEGIN IMMEDIATE")
+        for chunk in _chunks(rows, chunk_size):
+            ids += _insert_many(c, "moods", _MOOD_INSERT_SQL, [_mood_params(user_id, d) for d in chunk])
+            _rollup_moods(c, user_id, len(chunk))
+        _bump_data_version(c, user_id)
+    return ids
 
 def get_all_moods(user_id: str, limit: int = 200) -> list[dict]:
-    with get_db_context() as c:
+    with get_db_context(user_id) as c:
         rows = c.execute(
             "SELECT * FROM moods WHERE user_id=? ORDER BY timestamp DESC LIMIT ?",
             (user_id, limit)).fetchall()
         return [_row(r) for r in rows]
 
+def iter_moods(user_id: str, chunk_size: int = 500):
+    """Every mood of the user, newest first by epoch_us (see iter_transactions)."""
+    return _iter_rows(user_id, "SELECT * FROM moods WHERE user_id=? ORDER BY epoch_us DESC, id DESC",
+                      (user_id,), chunk_size)
+
 def get_recent_mood(user_id: str):
-    with get_db_context() as c:
+    with get_db_context(user_id) as c:
         r = c.execute(
             "SELECT * FROM moods WHERE user_id=? ORDER BY timestamp DESC LIMIT 1",
             (user_id,)).fetchone()
@@ -177,60 +1094,68 @@ def get_recent_mood(user_id: str):
 # ─────────────────── Savings Goals ───────────────────
 
 def get_savings_goals(user_id: str) -> list[dict]:
-    with get_db_context() as c:
+    with get_db_context(user_id) as c:
         rows = c.execute("SELECT * FROM savings_goals WHERE user_id=? ORDER BY id", (user_id,)).fetchall()
         return [_row(r) for r in rows]
 
 def insert_savings_goal(user_id: str, data: dict) -> int:
-    with get_db_context() as c:
+    with get_db_context(user_id) as c:
         cur = c.execute(
             "INSERT INTO savings_goals (user_id, name, target_amount, current_amount, deadline, created_at) VALUES (?,?,?,?,?,?)",
             (user_id, data["name"], data["target_amount"],
              data.get("current_amount", 0), data.get("deadline", ""), data["created_at"]))
+        _bump_data_version(c, user_id)
         return cur.lastrowid
 
-def update_savings_goal_amount(goal_id: int, add_amount: float):
-    with get_db_context() as c:
-        c.execute("UPDATE savings_goals SET current_amount = current_amount + ? WHERE id=?",
-                  (add_amount, goal_id))
+def _update_savings_goal_amount(c, user_id: str, goal_id: int, add_amount: float):
+    c.execute("UPDATE savings_goals SET current_amount = current_amount + ? WHERE id=? AND user_id=?",
+              (add_amount, goal_id, user_id))
+    _bump_data_version(c, user_id)
+
+def update_savings_goal_amount(user_id: str, goal_id: int, add_amount: float):
+    _write(user_id, _update_savings_goal_amount, user_id, goal_id, add_amount)
 
 
 # ─────────────────── Accountability Contacts ───────────────────
 
 def get_accountability_contacts(user_id: str) -> list[dict]:
-    with get_db_context() as c:
+    with get_db_context(user_id) as c:
         rows = c.execute(
             "SELECT * FROM accountability_contacts WHERE user_id=? AND is_active=1",
             (user_id,)).fetchall()
         return [_row(r) for r in rows]
 
 def insert_accountability_contact(user_id: str, data: dict) -> int:
-    with get_db_context() as c:
+    with get_db_context(user_id) as c:
         cur = c.execute(
             "INSERT INTO accountability_contacts (user_id, name, phone, email) VALUES (?,?,?,?)",
             (user_id, data["name"], data.get("phone", ""), data.get("email", "")))
+        _bump_data_version(c, user_id)
         return cur.lastrowid
 
 
 # ─────────────────── User Settings ───────────────────
 
+def _default_settings(user_id: str) -> dict:
+    return {
+        "user_id": user_id,
+        "lock_duration": 20,
+        "lock_sensitivity": "medium",
+        "enable_accountability": 1,
+        "enable_breathing": 1,
+        "enable_mood_alerts": 1,
+    }
+
 def get_user_settings(user_id: str) -> dict:
-    with get_db_context() as c:
+    with get_db_context(user_id) as c:
         r = c.execute("SELECT * FROM user_settings WHERE user_id=?", (user_id,)).fetchone()
         if r:
             return _row(r)
         # Return defaults
-        return {
-            "user_id": user_id,
-            "lock_duration": 20,
-            "lock_sensitivity": "medium",
-            "enable_accountability": 1,
-            "enable_breathing": 1,
-            "enable_mood_alerts": 1,
-        }
+        return _default_settings(user_id)
 
 def update_user_settings(user_id: str, settings: dict):
-    with get_db_context() as c:
+    with get_db_context(user_id) as c:
         existing = c.execute("SELECT id FROM user_settings WHERE user_id=?", (user_id,)).fetchone()
         if existing:
             c.execute(
@@ -248,25 +1173,263 @@ def update_user_settings(user_id: str, settings: dict):
                 (user_id, settings.get("lock_duration", 20), settings.get("lock_sensitivity", "medium"),
                  int(settings.get("enable_accountability", 1)), int(settings.get("enable_breathing", 1)),
                  int(settings.get("enable_mood_alerts", 1))))
+        _bump_data_version(c, user_id)
 
 
 # ─────────────────── User Data Mgmt ───────────────────
 
+_USER_TABLES = ("transactions", "moods", "savings_goals", "accountability_contacts", "user_settings",
+                "online_models")
+
 def clear_user_data(user_id: str):
-    with get_db_context() as c:
-        for tbl in ["transactions", "moods", "savings_goals", "accountability_contacts", "user_settings"]:
+    with get_db_context(user_id) as c:
+        for tbl in (*_USER_TABLES, *_ROLLUP_TABLES):
             c.execute(f"DELETE FROM {tbl} WHERE user_id=?", (user_id,))
+        _bump_data_version(c, user_id)
+    _invalidate_feature_state(user_id)
+
+_EMPTY_ROLLUP = {"tx_count": 0, "committed_count": 0, "committed_amount": 0, "committed_score_sum": 0,
+                 "cancelled_count": 0, "cancelled_amount": 0, "high_risk_count": 0, "mood_count": 0}
+
+def _user_rollup(c, user_id: str) -> dict:
+    r = c.execute("SELECT * FROM rollup_user WHERE user_id=?", (user_id,)).fetchone()
+    return _row(r) if r else {"user_id": user_id, **_EMPTY_ROLLUP}
 
 def get_user_stats(user_id: str) -> dict:
-    with get_db_context() as c:
-        tx = c.execute("SELECT COUNT(*) as cnt FROM transactions WHERE user_id=?", (user_id,)).fetchone()
-        saved = c.execute(
-            "SELECT COUNT(*) as cnt, COALESCE(SUM(amount),0) as total FROM transactions WHERE user_id=? AND was_cancelled=1",
-            (user_id,)).fetchone()
-        moods_n = c.execute("SELECT COUNT(*) as cnt FROM moods WHERE user_id=?", (user_id,)).fetchone()
+    with get_db_context(user_id) as c:
+        r = _user_rollup(c, user_id)
+        return {
+            "total_transactions": r["tx_count"],
+            "cancelled_count": r["cancelled_count"],
+            "money_saved": round(r["cancelled_amount"], 0),
+            "mood_entries": r["mood_count"],
+        }
+
+def get_trigger_rollup(user_id: str) -> dict:
+    """Rollup cells behind the trigger map (all transactions, incl. cancelled)."""
+    with get_db_context(user_id) as c:
+        c.execute("BEGIN")
         return {
-            "total_transactions": tx["cnt"],
-            "cancelled_count": saved["cnt"],
-            "money_saved": round(saved["total"], 0),
-            "mood_entries": moods_n["cnt"],
+            "totals": _user_rollup(c, user_id),
+            "hours": [tuple(r) for r in c.execute(
+                "SELECT weekday, hour, amount, count FROM rollup_hour WHERE user_id=? AND count > 0",
+                (user_id,))],
+            "categories": [tuple(r) for r in c.execute(
+                "SELECT category, amount, count FROM rollup_category WHERE user_id=? AND count > 0",
+                (user_id,))],
+            "cat_hours": [tuple(r) for r in c.execute(
+                "SELECT category, hour, amount, count FROM rollup_cat_hour WHERE user_id=? AND count > 0",
+                (user_id,))],
         }
+
+
+def get_dashboard_stats(user_id: str, recent_limit: int = 10) -> dict:
+    """Dashboard aggregates over the user's full history.
+
+    Totals and breakdowns come from the rollup tables, the streak from one
+    indexed query — the number of queries does not grow with history size.
+    """
+    with get_db_context(user_id) as c:
+        c.execute("BEGIN")
+        totals = _user_rollup(c, user_id)
+        cat_totals = {r["category"]: r["committed_amount"] for r in c.execute(
+            """SELECT category, committed_amount FROM rollup_category
+               WHERE user_id=? AND committed_count > 0
+               ORDER BY committed_amount DESC""", (user_id,))}
+        daily = {r["day"]: r["committed_amount"] for r in c.execute(
+            """SELECT day, committed_amount FROM rollup_daily
+               WHERE user_id=? AND committed_count > 0 ORDER BY day DESC""", (user_id,))}
+        # Self-control streak: rows newer than the latest committed risky one
+        streak = c.execute(
+            """SELECT COUNT(*) as cnt FROM transactions
+               WHERE user_id=?1 AND timestamp > COALESCE(
+                   (SELECT timestamp FROM transactions
+                    WHERE user_id=?1 AND was_cancelled=0 AND impulse_score >= 40
+                    ORDER BY timestamp DESC LIMIT 1), '')""", (user_id,)).fetchone()["cnt"]
+        recent = [_row(r) for r in c.execute(
+            "SELECT * FROM transactions WHERE user_id=? ORDER BY timestamp DESC LIMIT ?",
+            (user_id, recent_limit))]
+        goals = [_row(r) for r in c.execute(
+            "SELECT * FROM savings_goals WHERE user_id=? ORDER BY id", (user_id,))]
+        contacts = [_row(r) for r in c.execute(
+            "SELECT * FROM accountability_contacts WHERE user_id=? AND is_active=1", (user_id,))]
+    n = totals["committed_count"]
+    return {
+        "total_transactions": totals["tx_count"],
+        "total_spent": round(totals["committed_amount"], 0),
+        "money_saved": round(totals["cancelled_amount"], 0),
+        "cancelled_count": totals["cancelled_count"],
+        "avg_impulse_score": round(totals["committed_score_sum"] / n, 1) if n else 0,
+        "mood_entries": totals["mood_count"],
+        "self_control_streak": streak,
+        "category_breakdown": cat_totals,
+        "daily_spending": daily,
+        "recent_transactions": recent,
+        "savings_goals": goals,
+        "contacts": contacts,
+    }
+
+# ─────────────────── Analyze Snapshot ───────────────────
+
+@dataclass
+class UserSnapshot:
+    """Everything the analyze path needs about a user, read in one transaction."""
+    user_id: str
+    history: UserHistory       # committed transactions, newest first
+    all_history: UserHistory   # all transactions (incl. cancelled), newest first
+    moods: list[dict]          # newest first
+    goals: list[dict]
+    contacts: list[dict]
+    settings: dict
+    tx_count: int
+    data_version: int = 0                     # user_versions at snapshot time
+    features: Optional[FeatureState] = None   # scoring features over ``history``
+    online_model: Optional[OnlineLogit] = None  # only with VIBESHIELD_ML_MODEL=online
+
+    @property
+    def recent_mood(self) -> Optional[dict]:
+        return self.moods[0] if self.moods else None
+
+
+def load_user_context(user_id: str, history_limit: int = 200, mood_limit: int = 20) -> UserSnapshot:
+    """Load a consistent per-user snapshot on a single connection.
+
+    The committed and all-transaction windows come from one query: their
+    union ordered by timestamp starts with the newest ``history_limit`` rows
+    overall, and filtering it gives the newest committed rows.
+    """
+    with get_db_context(user_id) as c:
+        c.execute("BEGIN")
+        rows = _tuple_cursor(c).execute(
+            f"""{_HISTORY_SELECT} WHERE id IN (
+                   SELECT id FROM transactions WHERE user_id=? ORDER BY timestamp DESC LIMIT ?)
+               OR id IN (
+                   SELECT id FROM transactions WHERE user_id=? AND was_cancelled=0
+                   ORDER BY timestamp DESC LIMIT ?)
+               ORDER BY timestamp DESC""",
+            (user_id, history_limit, user_id, history_limit)).fetchall()
+        moods = [_row(r) for r in c.execute(
+            "SELECT * FROM moods WHERE user_id=? ORDER BY timestamp DESC LIMIT ?",
+            (user_id, mood_limit)).fetchall()]
+        goals = [_row(r) for r in c.execute(
+            "SELECT * FROM savings_goals WHERE user_id=? ORDER BY id", (user_id,)).fetchall()]
+        contacts = [_row(r) for r in c.execute(
+            "SELECT * FROM accountability_contacts WHERE user_id=? AND is_active=1",
+            (user_id,)).fetchall()]
+        settings = _row(c.execute(
+            "SELECT * FROM user_settings WHERE user_id=?", (user_id,)).fetchone())
+        tx_count = _user_rollup(c, user_id)["tx_count"]
+        online_model = _load_online_model(c, user_id) if ONLINE_ENABLED else None
+        data_version = _data_version(c, user_id)
+    cancelled = HISTORY_COLUMNS.index("was_cancelled")
+    history = UserHistory.from_cursor(islice((r for r in rows if not r[cancelled]), history_limit))
+    features = None
+    if history_limit >= FEATURE_WINDOW:
+        features = _cached_feature_state(user_id, data_version)
+        if features is None:
+            features = FeatureState.from_history(history)
+            _store_feature_state(user_id, data_version, features)
+    return UserSnapshot(
+        user_id=user_id,
+        history=history,
+        all_history=UserHistory.from_cursor(rows[:history_limit]),
+        moods=moods,
+        goals=goals,
+        contacts=contacts,
+        settings=settings or _default_settings(user_id),
+        tx_count=tx_count,
+        data_version=data_version,
+        features=features,
+        online_model=online_model,
+    )
+
+
+
+# ─────────────────── Shard Maintenance ───────────────────
+
+def _existing_db_files() -> list[str]:
+    base, ext = os.path.splitext(DB_PATH)
+    files = [DB_PATH] if os.path.exists(DB_PATH) else []
+    return files + sorted(glob.glob(f"{glob.escape(base)}.shard*{ext}"))
+
+
+def _move_user(src: str, dst: str, user_id: str):
+    """Copy one user's rows from src into dst, then delete them from src.
+
+    Runs on a standalone connection with src ATTACHed. Each file commits
+    atomically, so a crash can leave the user in both files but never in
+    neither; the user's rows in dst are replaced, so rerunning the move
+    after such a crash is safe. Row ids are reassigned in dst.
+    """
+    conn = _connect(dst)
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (src,))
+        conn.execute("BEGIN IMMEDIATE")
+        for tbl in _USER_TABLES:
+            cols = ", ".join(col for col in _columns(conn, tbl) if col != "id")
+            conn.execute(f"DELETE FROM main.{tbl} WHERE user_id=?", (user_id,))
+            conn.execute(f"INSERT INTO main.{tbl} ({cols}) SELECT {cols} FROM src.{tbl} WHERE user_id=?",
+                         (user_id,))
+            conn.execute(f"DELETE FROM src.{tbl} WHERE user_id=?", (user_id,))
+        for tbl in _ROLLUP_TABLES:
+            conn.execute(f"DELETE FROM src.{tbl} WHERE user_id=?", (user_id,))
+        _rebuild_rollups(conn, user_id)
+        conn.execute("""INSERT OR REPLACE INTO main.user_versions (user_id, version)
+                        SELECT user_id, version FROM src.user_versions WHERE user_id=?""", (user_id,))
+        conn.execute("DELETE FROM src.user_versions WHERE user_id=?", (user_id,))
+        conn.commit()
+        conn.execute("DETACH DATABASE src")
+    finally:
+        conn.close()
+
+
+def reshard(shards: int) -> dict:
+    """Rebalance all users onto ``shards`` database files (1 merges them back).
+
+    Scans every existing DB file, moves each user whose target file
+    changed and switches this process to the new shard count. Run it with
+    the app stopped, then set VIBESHIELD_DB_SHARDS to match.
+    """
+    global DB_SHARDS
+    close_db()
+    sources = _existing_db_files()
+    for path in set(sources) | set(shard_paths(shards)):
+        _get_pool(path).prepare()
+    moved = 0
+    for src in sources:
+        with get_db_context(path=src) as c:
+            users = [r["user_id"] for r in c.execute(
+                " UNION ".join(f"SELECT user_id FROM {tbl}" for tbl in _USER_TABLES))]
+        for user_id in users:
+            dst = shard_path(user_id, shards)
+            if dst != src:
+                _move_user(src, dst, user_id)
+                moved += 1
+    close_db()
+    DB_SHARDS = shards
+    return {"shards": shards, "files": shard_paths(shards), "users_moved": moved}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m app.database", description="VibeShield DB maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rebuild = sub.add_parser("rebuild-rollups", help="recompute rollup tables from raw rows")
+    p_rebuild.add_argument("--user", help="only this user_id (default: all users)")
+    p_online = sub.add_parser("retrain-online", help="replay history into the online impulse models")
+    p_online.add_argument("--user", help="only this user_id (default: all users)")
+    p_reshard = sub.add_parser("reshard", help="move users onto N shard files (1 = merge into one file)")
+    p_reshard.add_argument("shards", type=int)
+    args = parser.parse_args()
+
+    if args.command == "rebuild-rollups":
+        init_db()
+        rebuild_rollups(args.user)
+        print(f"✅ Rollups rebuilt for {args.user or 'all users'}")
+    elif args.command == "retrain-online":
+        init_db()
+        retrain_online_models(args.user)
+        print(f"✅ Online models retrained for {args.user or 'all users'}")
+    elif args.command == "reshard":
+        result = reshard(args.shards)
+        print(f"✅ {result['users_moved']} users moved onto {result['shards']} shard(s)")
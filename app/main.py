@@ -5,20 +5,35 @@ Main FastAPI application with per-user sessions.
 from fastapi import FastAPI, Request, Response
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
+import functools
 import os
 
-from app.database import init_db
+from app.database import init_db, close_db, write_queue_stats
+from app.ml.impulse_engine import forget_user_model, shutdown_training, training_stats
+from app.response_cache import cache as response_cache
 from app.routers import transactions, mood, dashboard
 from app.seed_data import seed_user_data
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# Fast start (default on Vercel): keep the cold-start import path minimal.
+# No schema work at import or startup; each DB file is checked (one PRAGMA
+# read when current) on its first query instead.
+FAST_START = os.environ.get(
+    "VIBESHIELD_FAST_START", "1" if os.environ.get("VERCEL") else "0"
+).lower() in ("1", "true", "yes", "on")
+
 app = FastAPI(title="VibeShield", version="2.0")
 
 # Static files & templates
 app.mount("/static", StaticFiles(directory=os.path.join(BASE_DIR, "static")), name="static")
-templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
+
+
+@functools.lru_cache(maxsize=None)
+def _templates():
+    # Jinja is only needed by the HTML pages, not by API-only cold starts
+    from fastapi.templating import Jinja2Templates
+    return Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
 # Include routers
 app.include_router(transactions.router)
@@ -28,14 +43,21 @@ app.include_router(dashboard.router)
 
 @app.on_event("startup")
 def startup():
-    init_db()
+    if not FAST_START:
+        init_db()
     if not os.environ.get("VERCEL"):
         print("✅ VibeShield DB initialized (per-user isolation)")
         print("🚀 Open http://localhost:8000 to start")
 
 
+@app.on_event("shutdown")
+def shutdown():
+    shutdown_training()
+    close_db()
+
+
 # Auto-init DB on Vercel cold starts (no startup event in serverless)
-if os.environ.get("VERCEL"):
+if os.environ.get("VERCEL") and not FAST_START:
     init_db()
 
 
@@ -61,7 +83,7 @@ async def login_page(request: Request):
     uid, _ = _get_user(request)
     if uid:
         return RedirectResponse("/", status_code=302)
-    return templates.TemplateResponse("login.html", {"request": request})
+    return _templates().TemplateResponse("login.html", {"request": request})
 
 
 @app.post("/api/login")
@@ -93,12 +115,21 @@ async def seed_demo(request: Request):
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    from app.database import clear_user_data
-    clear_user_data(uid)
-    result = seed_user_data(uid, days=30)
+    from app import database as db
+    await db.run(db.clear_user_data, uid)
+    await db.run(forget_user_model, uid)
+    result = await db.run(seed_user_data, uid, days=30)
     return {"status": "seeded", **result}
 
 
+# ─── Metrics ───
+
+@app.get("/api/metrics")
+async def metrics():
+    return {"write_queue": write_queue_stats(), "training": training_stats(),
+            "response_cache": response_cache.stats()}
+
+
 # ─── Page Routes ───
 
 @app.get("/", response_class=HTMLResponse)
@@ -107,7 +138,7 @@ async def home(request: Request):
     if not uid:
         return RedirectResponse("/login", status_code=302)
     _, name = _get_user(request)
-    return templates.TemplateResponse("index.html", {
+    return _templates().TemplateResponse("index.html", {
         "request": request, "user_name": name, "user_id": uid,
     })
 
@@ -118,7 +149,7 @@ async def dashboard_page(request: Request):
     if not uid:
         return RedirectResponse("/login", status_code=302)
     _, name = _get_user(request)
-    return templates.TemplateResponse("dashboard.html", {
+    return _templates().TemplateResponse("dashboard.html", {
         "request": request, "user_name": name, "user_id": uid,
     })
 
@@ -129,7 +160,7 @@ async def triggers_page(request: Request):
     if not uid:
         return RedirectResponse("/login", status_code=302)
     _, name = _get_user(request)
-    return templates.TemplateResponse("triggers.html", {
+    return _templates().TemplateResponse("triggers.html", {
         "request": request, "user_name": name, "user_id": uid,
     })
 
@@ -140,6 +171,6 @@ async def mood_page(request: Request):
     if not uid:
         return RedirectResponse("/login", status_code=302)
     _, name = _get_user(request)
-    return templates.TemplateResponse("mood.html", {
+    return _templates().TemplateResponse("mood.html", {
         "request": request, "user_name": name, "user_id": uid,
     })
@@ -0,0 +1,127 @@
+"""
+Incremental per-user scoring features.
+
+The history-based impulse factors (amount deviation, frequency spike,
+repeat category) only look at the user's newest committed transactions.
+FeatureState keeps exactly those rows together with running statistics,
+so scoring is O(1) in history length and a commit is O(log window):
+
+  * Welford mean / variance of amounts (with removal on eviction)
+  * timestamps kept sorted, so "how many in the last hour" is a bisect
+  * per-(category, day) counters for the repeat factor
+"""
+import math
+from bisect import bisect_right, insort
+from typing import Optional
+
+from app.ml.history import NO_TIME, UserHistory
+from app.timefields import HOUR_US, row_time
+
+# Same window the scoring paths load: get_committed_transactions(limit=200)
+FEATURE_WINDOW = 200
+
+
+class FeatureState:
+    """Running features over a user's newest ``window`` committed transactions."""
+
+    __slots__ = ("window", "_entries", "_ids", "_n", "_mean", "_m2", "_same_day")
+
+    def __init__(self, window: int = FEATURE_WINDOW):
+        self.window = window
+        self._entries: list[tuple] = []      # (epoch_us, id, amount, category, day_num), oldest first
+        self._ids: set = set()
+        self._n = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._same_day: dict[tuple[str, int], int] = {}
+
+    @classmethod
+    def from_history(cls, history, window: int = FEATURE_WINDOW) -> "FeatureState":
+        """Build from committed rows (a UserHistory or dicts, any order).
+
+        Rows without a usable timestamp are skipped.
+        """
+        state = cls(window)
+        if isinstance(history, UserHistory):
+            names = history.categories
+            for tx_id, epoch_us, amount, code, day_num in zip(
+                    history.ids, history.epoch_us, history.amounts,
+                    history.category_codes, history.day_nums):
+                if epoch_us != NO_TIME:
+                    state._add(epoch_us, tx_id or None, amount, names[code], day_num)
+        else:
+            for t in history:
+                state.add(t)
+        return state
+
+    def __len__(self):
+        return self._n
+
+    def copy(self) -> "FeatureState":
+        """Independent copy, O(window)."""
+        clone = FeatureState(self.window)
+        clone._entries = list(self._entries)
+        clone._ids = set(self._ids)
+        clone._n, clone._mean, clone._m2 = self._n, self._mean, self._m2
+        clone._same_day = dict(self._same_day)
+        return clone
+
+    def add(self, t: dict) -> bool:
+        """Observe a committed transaction; returns False if it is not in the window."""
+        try:
+            epoch_us, _, _, day_num = row_time(t)
+        except Exception:
+            return False
+        return self._add(epoch_us, t.get("id"), t["amount"], t["category"], day_num)
+
+    def _add(self, epoch_us: int, tx_id, amount: float, category: str, day_num: int) -> bool:
+        if tx_id is not None and tx_id in self._ids:
+            return False
+        entry = (epoch_us, tx_id, amount, category, day_num)
+        if self._n >= self.window:
+            if epoch_us <= self._entries[0][0]:
+                return False
+            self._remove(self._entries.pop(0))
+        insort(self._entries, entry, key=lambda e: e[0])
+        if entry[1] is not None:
+            self._ids.add(entry[1])
+        self._n += 1
+        delta = entry[2] - self._mean
+        self._mean += delta / self._n
+        self._m2 += delta * (entry[2] - self._mean)
+        key = (entry[3], day_num)
+        self._same_day[key] = self._same_day.get(key, 0) + 1
+        return True
+
+    def _remove(self, entry: tuple):
+        self._ids.discard(entry[1])
+        self._n -= 1
+        if self._n == 0:
+            self._mean = self._m2 = 0.0
+        else:
+            delta = entry[2] - self._mean
+            self._mean -= delta / self._n
+            self._m2 = max(0.0, self._m2 - delta * (entry[2] - self._mean))
+        key = (entry[3], entry[4])
+        left = self._same_day[key] - 1
+        if left:
+            self._same_day[key] = left
+        else:
+            del self._same_day[key]
+
+    # ─── Features ───
+
+    def amount_stats(self) -> Optional[tuple[float, float]]:
+        """(mean, std) of windowed amounts as _amount_score computes them; None if empty."""
+        if not self._n:
+            return None
+        if self._n < 2:
+            return self._mean, self._mean * 0.5
+        return self._mean, math.sqrt(self._m2 / self._n)
+
+    def recent_count(self, ts_us: int) -> int:
+        """Windowed transactions in the hour before ``ts_us`` (or after it)."""
+        return self._n - bisect_right(self._entries, ts_us - HOUR_US, key=lambda e: e[0])
+
+    def same_day_count(self, category: str, day_num: int) -> int:
+        return self._same_day.get((category, day_num), 0)
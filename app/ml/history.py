@@ -0,0 +1,112 @@
+"""
+Column-oriented transaction history.
+
+The analyze path used to hand every scorer a list of row dicts, and each
+one walked and re-parsed it. UserHistory holds the same rows as parallel
+typed arrays, built straight from a DB cursor (no per-row dicts), and is
+what the factor scorers, get_user_context, train_model and trigger_mapper
+work on. Lists of dicts are still accepted everywhere via as_history().
+"""
+from array import array
+from typing import Iterable, Union
+
+from app.timefields import row_time
+
+# Column order UserHistory.from_cursor() expects
+HISTORY_COLUMNS = ("id", "epoch_us", "hour", "weekday", "day_num", "amount", "impulse_score",
+                   "category", "was_paused", "was_overridden", "was_cancelled", "timestamp")
+
+PAUSED, OVERRIDDEN, CANCELLED = 1, 2, 4
+
+# Rows whose timestamp does not parse: never "recent", never "today", no hour
+NO_TIME = -(2 ** 63)
+
+
+class UserHistory:
+    """Transactions as parallel arrays, in the order they were added (newest first)."""
+
+    __slots__ = ("ids", "epoch_us", "hours", "weekdays", "day_nums", "amounts", "scores",
+                 "flags", "category_codes", "categories", "_codes")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.epoch_us = array("q")
+        self.hours = array("b")
+        self.weekdays = array("b")
+        self.day_nums = array("q")
+        self.amounts = array("d")
+        self.scores = array("d")
+        self.flags = array("B")
+        self.category_codes = array("H")
+        self.categories: list[str] = []     # code → category name
+        self._codes: dict[str, int] = {}
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def code(self, category: str) -> int:
+        """Code of ``category``, or -1 if no row has it."""
+        return self._codes.get(category, -1)
+
+    def _intern(self, category: str) -> int:
+        code = self._codes.get(category)
+        if code is None:
+            code = self._codes[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def append(self, tx_id, epoch_us, hour, weekday, day_num, amount, score, category,
+               paused=0, overridden=0, cancelled=0):
+        if epoch_us is None:
+            epoch_us = day_num = NO_TIME
+            hour = weekday = -1
+        self.ids.append(tx_id or 0)
+        self.epoch_us.append(epoch_us)
+        self.hours.append(hour)
+        self.weekdays.append(weekday)
+        self.day_nums.append(day_num)
+        self.amounts.append(amount)
+        self.scores.append(score or 0)
+        self.flags.append((PAUSED if paused else 0) | (OVERRIDDEN if overridden else 0)
+                          | (CANCELLED if cancelled else 0))
+        self.category_codes.append(self._intern(category))
+
+    def cancelled(self, i: int) -> bool:
+        return bool(self.flags[i] & CANCELLED)
+
+    @classmethod
+    def from_cursor(cls, rows: Iterable[tuple]) -> "UserHistory":
+        """Build from tuples in HISTORY_COLUMNS order (e.g. a cursor without row_factory)."""
+        h = cls()
+        for tx_id, epoch_us, hour, weekday, day_num, amount, score, category, p, o, c, ts in rows:
+            if epoch_us is None:
+                epoch_us, hour, weekday, day_num = _parse(ts)
+            h.append(tx_id, epoch_us, hour, weekday, day_num, amount, score, category, p, o, c)
+        return h
+
+    @classmethod
+    def from_dicts(cls, rows: Iterable[dict]) -> "UserHistory":
+        h = cls()
+        for t in rows:
+            try:
+                epoch_us, hour, weekday, day_num = row_time(t)
+            except Exception:
+                epoch_us = hour = weekday = day_num = None
+            h.append(t.get("id"), epoch_us, hour, weekday, day_num, t["amount"],
+                     t.get("impulse_score", 0), t["category"], t.get("was_paused"),
+                     t.get("was_overridden"), t.get("was_cancelled"))
+        return h
+
+
+def _parse(timestamp):
+    try:
+        return row_time({"timestamp": timestamp})
+    except Exception:
+        return None, None, None, None
+
+
+def as_history(history: Union[UserHistory, Iterable[dict], None]) -> UserHistory:
+    """UserHistory as-is; a list of transaction dicts converted once."""
+    if isinstance(history, UserHistory):
+        return history
+    return UserHistory.from_dicts(history or ())
@@ -7,11 +7,24 @@ Lock threshold adapts to user's transaction history:
   5–20 transactions → 55 (learning phase)
   > 20 transactions → 62 (calibrated)
 """
+import heapq
+import os
 import random
 import math
-from datetime import datetime, timedelta
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from itertools import islice
 from typing import Optional
 
+from app.ml.feature_state import FeatureState
+from app.ml.history import CANCELLED, UserHistory, as_history
+from app.ml.keyword_matcher import KeywordMatcher
+from app.ml.model_registry import ModelRegistry
+from app.ml import online_model
+from app.timefields import HOUR_US, day_number, time_fields
+
 
 def _mean(lst):
     return sum(lst) / len(lst) if lst else 0
@@ -116,17 +129,33 @@ ITEM_TO_CATEGORY: dict[str, str] = {
     "ajio": "online_shopping", "nykaa": "online_shopping",
 }
 
+_item_matcher: Optional[KeywordMatcher] = None
+_item_matcher_lock = threading.Lock()
+
+
+def _get_item_matcher() -> KeywordMatcher:
+    # Built on first use rather than at import (keeps cold starts short)
+    global _item_matcher
+    if _item_matcher is None:
+        with _item_matcher_lock:
+            if _item_matcher is None:
+                _item_matcher = KeywordMatcher(ITEM_TO_CATEGORY)
+    return _item_matcher
+
+
 def detect_category_from_item(item_text: str) -> Optional[str]:
-    """Detect category from free-text item description."""
-    text = item_text.lower().strip()
-    # Exact match first
-    if text in ITEM_TO_CATEGORY:
-        return ITEM_TO_CATEGORY[text]
-    # Substring match
-    for keyword, cat in ITEM_TO_CATEGORY.items():
-        if keyword in text or text in keyword:
-            return cat
-    return None
+    """Detect category from free-text item description.
+
+    Exact keyword first, then the longest keyword in the text, then the
+    shortest keyword the text is part of (partial typing).
+    """
+    return _get_item_matcher().detect(item_text)
+
+
+def add_item_keyword(keyword: str, category: str):
+    """Teach detect_category_from_item a new (or re-mapped) keyword."""
+    _get_item_matcher().add(keyword, category)
+    ITEM_TO_CATEGORY[keyword.lower().strip()] = category
 
 REFLECTIVE_QUESTIONS = [
     "Will this matter in 7 days?",
@@ -296,8 +325,17 @@ def _cat_score(category: str) -> float:
     return CATEGORY_RISK.get(category, 0.40)
 
 
-def _amount_score(amount: float, history: list[dict]) -> float:
+def _amount_score(amount: float, history: UserHistory) -> float:
     if not history:
+        return _amount_score_from_stats(amount, None)
+    amounts = history.amounts
+    avg = _mean(amounts)
+    std = _std(amounts) if len(amounts) > 1 else avg * 0.5
+    return _amount_score_from_stats(amount, (avg, std))
+
+
+def _amount_score_from_stats(amount: float, stats: Optional[tuple[float, float]]) -> float:
+    if stats is None:
         # No history — use absolute amount heuristics
         if amount >= 3000:
             return 0.82
@@ -308,34 +346,29 @@ def _amount_score(amount: float, history: list[dict]) -> float:
         if amount >= 200:
             return 0.30
         return 0.15
-    amounts = [t["amount"] for t in history]
-    avg = _mean(amounts)
-    std = _std(amounts) if len(amounts) > 1 else avg * 0.5
+    avg, std = stats
     if std == 0:
         return 0.55 if amount > avg else 0.15
     z = (amount - avg) / std
     return _clip(0.50 + z * 0.20, 0.0, 1.0)
 
 
-def _freq_score(ts: datetime, history: list[dict]) -> tuple[float, int]:
+def _freq_score(ts_us: int, history: UserHistory) -> tuple[float, int]:
     if not history:
         return 0.10, 0
-    cutoff = ts - timedelta(hours=1)
-    count = 0
-    for t in history:
-        try:
-            t_ts = datetime.fromisoformat(t["timestamp"])
-            if t_ts > cutoff:
-                count += 1
-        except Exception:
-            pass
+    cutoff = ts_us - HOUR_US
+    count = sum(1 for e in history.epoch_us if e > cutoff)
+    return _freq_level(count), count
+
+
+def _freq_level(count: int) -> float:
     if count >= 4:
-        return 1.0, count
+        return 1.0
     if count >= 2:
-        return 0.65, count
+        return 0.65
     if count >= 1:
-        return 0.35, count
-    return 0.10, count
+        return 0.35
+    return 0.10
 
 
 def _mood_score(mood_data: list[dict]) -> tuple[float, str]:
@@ -349,32 +382,37 @@ def _day_score(day: int) -> float:
     return {0: 0.25, 1: 0.20, 2: 0.20, 3: 0.25, 4: 0.50, 5: 0.65, 6: 0.72}.get(day, 0.30)
 
 
-def _repeat_score(category: str, ts: datetime, history: list[dict]) -> tuple[float, int]:
+def _repeat_score(category: str, day_num: int, history: UserHistory) -> tuple[float, int]:
     if not history:
         return 0.10, 0
-    today = ts.date()
-    count = 0
-    for t in history:
-        try:
-            t_ts = datetime.fromisoformat(t["timestamp"])
-            if t_ts.date() == today and t["category"] == category:
-                count += 1
-        except Exception:
-            pass
+    code = history.code(category)
+    count = sum(1 for c, d in zip(history.category_codes, history.day_nums)
+                if c == code and d == day_num)
+    return _repeat_level(count), count
+
+
+def _repeat_level(count: int) -> float:
     if count >= 3:
-        return 0.95, count
+        return 0.95
     if count >= 2:
-        return 0.70, count
+        return 0.70
     if count >= 1:
-        return 0.40, count
-    return 0.10, count
+        return 0.40
+    return 0.10
 
 
 # ─── Main Score Calculator ───
 
-def calculate_impulse_score(amount, category, timestamp_str, transaction_history, mood_data):
-    """Returns (score, risk_level, factors_dict)."""
+def calculate_impulse_score(amount, category, timestamp_str, transaction_history, mood_data,
+                            features: Optional[FeatureState] = None):
+    """Returns (score, risk_level, factors_dict).
+
+    ``transaction_history`` is a UserHistory or a list of transaction dicts.
+    With ``features`` (the user's FeatureState) the history-based factors
+    are read from it in O(1) and ``transaction_history`` is not scanned.
+    """
     ts = datetime.fromisoformat(timestamp_str) if isinstance(timestamp_str, str) else timestamp_str
+    ts_us, _, _, day_num = time_fields(ts)
     day_names = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
     factors = {}
 
@@ -388,12 +426,20 @@ def calculate_impulse_score(amount, category, timestamp_str, transaction_history
                                  "detail": category.replace("_", " ").title(),
                                  "label": "Category Risk"}
 
-    a = _amount_score(amount, transaction_history)
+    if features is not None:
+        a = _amount_score_from_stats(amount, features.amount_stats())
+        fc = features.recent_count(ts_us)
+        rc = features.same_day_count(category, day_num)
+        f, r = _freq_level(fc), _repeat_level(rc)
+    else:
+        history = as_history(transaction_history)
+        a = _amount_score(amount, history)
+        f, fc = _freq_score(ts_us, history)
+        r, rc = _repeat_score(category, day_num, history)
     factors["amount_deviation"] = {"score": round(a, 2), "weight": 20,
                                     "detail": f"₹{amount:,.0f}",
                                     "label": "Amount vs Usual"}
 
-    f, fc = _freq_score(ts, transaction_history)
     factors["frequency_spike"] = {"score": round(f, 2), "weight": 15,
                                    "detail": f"{fc} in last hour",
                                    "label": "Frequency Spike"}
@@ -408,7 +454,6 @@ def calculate_impulse_score(amount, category, timestamp_str, transaction_history
                                "detail": day_names[ts.weekday()],
                                "label": "Day Pattern"}
 
-    r, rc = _repeat_score(category, ts, transaction_history)
     factors["repeat_category"] = {"score": round(r, 2), "weight": 5,
                                    "detail": f"{rc} same-category today",
                                    "label": "Repeat Category"}
@@ -420,6 +465,86 @@ def calculate_impulse_score(amount, category, timestamp_str, transaction_history
     return score, risk, factors
 
 
+# ─── Batch Scoring ───
+
+# Column order of the factor matrix returned by calculate_impulse_scores_batch
+FACTOR_WEIGHTS = (("time_of_day", 25), ("category_risk", 15), ("amount_deviation", 20),
+                  ("frequency_spike", 15), ("mood_influence", 10), ("day_pattern", 10),
+                  ("repeat_category", 5))
+
+
+def _count_score(count, steps):
+    """Vectorised form of the count → score ladders in _freq_score/_repeat_score."""
+    import numpy as np
+    (n3, s3), (n2, s2), (n1, s1), s0 = steps
+    return np.where(count >= n3, s3, np.where(count >= n2, s2, np.where(count >= n1, s1, s0)))
+
+
+def calculate_impulse_scores_batch(transactions, transaction_history, mood_data, with_factors=False):
+    """Score many candidate transactions against one history in a single pass.
+
+    ``transactions`` are dicts with amount, category and timestamp. Returns
+    (scores, risk_levels, factors) as plain lists: factors holds one row of
+    7 rounded factor scores per transaction in FACTOR_WEIGHTS order, or is
+    None unless ``with_factors``.
+    Results are identical to calling calculate_impulse_score() per row, which
+    is also the fallback when numpy is not installed.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        scored = [calculate_impulse_score(t["amount"], t["category"], t["timestamp"],
+                                          transaction_history, mood_data) for t in transactions]
+        factors = [[f[k]["score"] for k, _ in FACTOR_WEIGHTS] for _, _, f in scored] if with_factors else None
+        return [s for s, _, _ in scored], [r for _, r, _ in scored], factors
+
+    n = len(transactions)
+    times = [time_fields(t["timestamp"]) for t in transactions]
+    ts_us = np.array([tf[0] for tf in times], dtype=np.int64)
+    hours = np.array([tf[1] for tf in times], dtype=np.int64)
+    weekdays = np.array([tf[2] for tf in times], dtype=np.int64)
+    amounts = np.array([t["amount"] for t in transactions], dtype=np.float64)
+
+    time_f = np.array([_time_score(h) for h in range(24)])[hours]
+    cat_f = np.array([_cat_score(t["category"]) for t in transactions], dtype=np.float64)
+    day_f = np.array([_day_score(d) for d in range(7)])[weekdays]
+    mood_f = np.full(n, _mood_score(mood_data)[0])
+
+    history = as_history(transaction_history)
+    if history:
+        avg = _mean(history.amounts)
+        std = _std(history.amounts) if len(history) > 1 else avg * 0.5
+        if std == 0:
+            amount_f = np.where(amounts > avg, 0.55, 0.15)
+        else:
+            amount_f = np.clip(0.50 + (amounts - avg) / std * 0.20, 0.0, 1.0)
+
+        # Rows without a usable time sort first and are never counted
+        epochs = np.sort(np.frombuffer(history.epoch_us, dtype=np.int64))
+        recent = len(epochs) - np.searchsorted(epochs, ts_us - HOUR_US, side="right")
+        freq_f = _count_score(recent, ((4, 1.0), (2, 0.65), (1, 0.35), 0.10))
+        same_day: dict[tuple[int, int], int] = {}
+        for key in zip(history.category_codes, history.day_nums):
+            same_day[key] = same_day.get(key, 0) + 1
+        repeats = np.array([same_day.get((history.code(t["category"]), tf[3]), 0)
+                            for t, tf in zip(transactions, times)], dtype=np.int64)
+        repeat_f = _count_score(repeats, ((3, 0.95), (2, 0.70), (1, 0.40), 0.10))
+    else:
+        amount_f = np.select([amounts >= 3000, amounts >= 1500, amounts >= 500, amounts >= 200],
+                             [0.82, 0.65, 0.48, 0.30], 0.15)
+        freq_f = repeat_f = np.full(n, 0.10)
+
+    # Per-factor rounding must match round(x, 2) exactly, so it stays in Python
+    matrix = np.array([[round(x, 2) for x in col.tolist()]
+                       for col in (time_f, cat_f, amount_f, freq_f, mood_f, day_f, repeat_f)]).T.reshape(n, 7)
+    total = np.zeros(n)
+    for i, (_, weight) in enumerate(FACTOR_WEIGHTS):
+        total = total + matrix[:, i] * weight
+    scores = [round(min(100, max(0, x)), 1) for x in total.tolist()]
+    risks = ["high" if s >= 65 else ("medium" if s >= 40 else "low") for s in scores]
+    return scores, risks, (matrix.tolist() if with_factors else None)
+
+
 def get_reflective_question():
     return random.choice(REFLECTIVE_QUESTIONS)
 
@@ -452,15 +577,18 @@ def get_user_context(user_id, history, moods, goals, recent_mood):
             "remaining": max(0, g["target_amount"] - g.get("current_amount", 0)),
         }
 
+    history = as_history(history)
+
     # Spending streak (days without impulse buy)
     streak = 0
     if history:
-        from datetime import datetime, timedelta
-        today = datetime.now().date()
+        # day_num → every transaction that day was cancelled
+        all_cancelled: dict[int, bool] = {}
+        for d, flags in zip(history.day_nums, history.flags):
+            all_cancelled[d] = all_cancelled.get(d, True) and bool(flags & CANCELLED)
+        today = day_number(datetime.now().date())
         for i in range(30):
-            day = today - timedelta(days=i)
-            day_txs = [t for t in history if t.get("timestamp", "")[:10] == str(day)]
-            if not day_txs or all(t.get("was_cancelled", 0) for t in day_txs):
+            if all_cancelled.get(today - i, True):
                 streak += 1
             else:
                 break
@@ -469,9 +597,9 @@ def get_user_context(user_id, history, moods, goals, recent_mood):
     # Top trigger category
     if history:
         cat_counts = {}
-        for t in history[:50]:
-            cat = t.get("category", "other")
-            if t.get("impulse_score", 0) >= 50:
+        for code, score in islice(zip(history.category_codes, history.scores), 50):
+            cat = history.categories[code]
+            if score >= 50:
                 cat_counts[cat] = cat_counts.get(cat, 0) + 1
         if cat_counts:
             top_cat = max(cat_counts, key=cat_counts.get)
@@ -481,51 +609,254 @@ def get_user_context(user_id, history, moods, goals, recent_mood):
             }
 
     # Money saved stat
-    saved_txs = [t for t in (history or []) if t.get("was_cancelled", 0)]
-    context["total_saved"] = round(sum(t.get("amount", 0) for t in saved_txs), 0)
+    context["total_saved"] = round(sum(a for a, flags in zip(history.amounts, history.flags)
+                                       if flags & CANCELLED), 0)
 
     return context
 
 
 # ─── Per-user scikit-learn model ───
 
-_models: dict[str, object] = {}
+# Trained forests are persisted per user and loaded lazily (see model_registry)
+_registry = ModelRegistry()
+
+
+def _watermark(h: UserHistory) -> tuple[int, int]:
+    """Identifies the training data: row count and newest id."""
+    return len(h), max(h.ids) if len(h) else 0
 
 
-def train_model(user_id: str, transactions: list[dict]):
-    """Train a RandomForest for a specific user once they have enough data."""
-    if len(transactions) < 15:
+def train_model(user_id: str, transactions):
+    """Train a RandomForest for a specific user once they have enough data.
+
+    ``transactions`` is a UserHistory or a list of transaction dicts. Skipped
+    when the stored model was trained on the same data.
+    """
+    h = as_history(transactions)
+    if len(h) < 15:
+        return
+    watermark = _watermark(h)
+    if _registry.watermark(user_id) == watermark:
         return
     try:
         from sklearn.ensemble import RandomForestClassifier
-        X, y = [], []
-        for t in transactions:
-            ts = datetime.fromisoformat(t["timestamp"])
-            X.append([ts.hour, ts.weekday(), t["amount"],
-                      CATEGORY_RISK.get(t["category"], 0.4)])
-            y.append(1 if t.get("impulse_score", 0) >= 55 else 0)
+        risk = [CATEGORY_RISK.get(cat, 0.4) for cat in h.categories]
+        X = [[hour, weekday, amount, risk[code]]
+             for hour, weekday, amount, code in zip(h.hours, h.weekdays, h.amounts, h.category_codes)]
+        y = [1 if score >= 55 else 0 for score in h.scores]
         if len(set(y)) < 2:
             return
         import numpy as _np
+        from app.ml.tree_compiler import compile_forest
         clf = RandomForestClassifier(n_estimators=50, max_depth=5, random_state=42)
         clf.fit(_np.array(X), _np.array(y))
-        _models[user_id] = clf
+        # Served from the compiled arrays, so predictions never need sklearn
+        _registry.put(user_id, compile_forest(clf), watermark)
     except Exception:
         pass
 
 
-def ml_impulse_probability(user_id, amount, category, timestamp_str):
-    """Get ML model prediction if available."""
-    model = _models.get(user_id)
+# ─── Background Training ───
+
+# Retrain a user's model after this many new rows, or this many seconds
+# after the first untrained row, whichever comes first
+TRAIN_EVERY_ROWS = int(os.environ.get("VIBESHIELD_TRAIN_EVERY", "10"))
+TRAIN_DEBOUNCE_S = float(os.environ.get("VIBESHIELD_TRAIN_DEBOUNCE_S", "5"))
+TRAIN_WORKERS = int(os.environ.get("VIBESHIELD_TRAIN_WORKERS", "2"))
+
+
+class TrainingScheduler:
+    """Debounced per-user retraining on a background worker pool.
+
+    schedule() is cheap and never trains inline. Rows are counted per user;
+    a retrain is submitted once ``every_rows`` have accumulated or
+    ``debounce_s`` after the first one. ``loader`` is called on the worker,
+    so the request path never reads the full history either. At most one
+    training per user runs at a time; rows that arrive meanwhile trigger
+    one follow-up run. Debounce deadlines live in one heap served by a
+    single timer thread, whatever the number of users waiting.
+    train_model() builds the new forest off to the side
+    and only then replaces the stored one (ModelRegistry.put writes the file
+    atomically and swaps the cached entry), so predictions never see a
+    half-trained model. cancel() forgets a user's queued work; a run already
+    in progress has its result deleted when it finishes.
+    """
+
+    def __init__(self, every_rows: int = TRAIN_EVERY_ROWS, debounce_s: float = TRAIN_DEBOUNCE_S,
+                 workers: int = TRAIN_WORKERS):
+        self.every_rows = max(1, every_rows)
+        self.debounce_s = debounce_s
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: dict[str, int] = {}
+        self._loaders: dict = {}
+        self._deadlines: dict[str, float] = {}              # user_id → debounce deadline (monotonic)
+        self._heap: list[tuple[float, str]] = []            # may hold superseded entries
+        self._wake = threading.Condition(self._lock)
+        self._timer: Optional[threading.Thread] = None
+        self._running: set[str] = set()
+        self._cancelled: set[str] = set()
+        self._submitted = self._started = self._completed = self._failed = 0
+        self._total_ms = self._last_ms = self._max_ms = 0.0
+
+    def schedule(self, user_id: str, loader, new_rows: int = 1):
+        """Note ``new_rows`` new transactions for ``user_id``; ``loader()`` returns its history."""
+        with self._lock:
+            self._loaders[user_id] = loader
+            pending = self._pending[user_id] = self._pending.get(user_id, 0) + new_rows
+            if pending >= self.every_rows:
+                self._submit(user_id)
+            elif user_id not in self._deadlines:
+                deadline = self._deadlines[user_id] = time.monotonic() + self.debounce_s
+                heapq.heappush(self._heap, (deadline, user_id))
+                if self._timer is None:
+                    self._timer = threading.Thread(target=self._run_timer, name="vibeshield-train-timer",
+                                                   daemon=True)
+                    self._timer.start()
+                self._wake.notify()
+
+    def cancel(self, user_id: str):
+        """Drop pending work for ``user_id`` (e.g. its data was cleared)."""
+        with self._lock:
+            self._deadlines.pop(user_id, None)
+            self._pending.pop(user_id, None)
+            self._loaders.pop(user_id, None)
+            if user_id in self._running:
+                self._cancelled.add(user_id)
+
+    def _run_timer(self):
+        """Submit users whose debounce deadline has passed; exits when shutdown() replaces it."""
+        with self._lock:
+            while self._timer is threading.current_thread():
+                now = time.monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    deadline, user_id = heapq.heappop(self._heap)
+                    if self._deadlines.get(user_id) == deadline:   # else cancelled or submitted early
+                        del self._deadlines[user_id]
+                        if user_id in self._pending:
+                            self._submit(user_id)
+                self._wake.wait(self._heap[0][0] - now if self._heap else None)
+
+    def _submit(self, user_id: str):
+        # caller holds self._lock
+        self._deadlines.pop(user_id, None)
+        if user_id in self._running:
+            return  # picked up again when the running job finishes
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                thread_name_prefix="vibeshield-train")
+        del self._pending[user_id]
+        loader = self._loaders.pop(user_id)
+        self._running.add(user_id)
+        self._submitted += 1
+        self._executor.submit(self._train, user_id, loader)
+
+    def _train(self, user_id: str, loader):
+        with self._lock:
+            self._started += 1
+        started = time.perf_counter()
+        ok = True
+        try:
+            train_model(user_id, loader())
+        except Exception:
+            ok = False
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._running.discard(user_id)
+            if user_id in self._cancelled:
+                # Trained on data that has since been cleared
+                self._cancelled.discard(user_id)
+                _registry.delete(user_id)
+            if ok:
+                self._completed += 1
+            else:
+                self._failed += 1
+            self._total_ms += elapsed_ms
+            self._last_ms = elapsed_ms
+            self._max_ms = max(self._max_ms, elapsed_ms)
+            if user_id in self._pending and user_id not in self._deadlines:
+                self._submit(user_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            finished = self._completed + self._failed
+            return {
+                "pending_users": len(self._pending),
+                "queued": self._submitted - self._started,
+                "running": len(self._running),
+                "completed": self._completed,
+                "failed": self._failed,
+                "avg_ms": round(self._total_ms / finished, 1) if finished else 0,
+                "last_ms": round(self._last_ms, 1),
+                "max_ms": round(self._max_ms, 1),
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Drop pending debounced work and stop the timer thread and worker pool."""
+        with self._lock:
+            self._deadlines.clear()
+            self._heap.clear()
+            self._timer = None
+            self._wake.notify()
+            self._pending.clear()
+            self._loaders.clear()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+_scheduler = TrainingScheduler()
+
+
+def schedule_training(user_id: str, loader, new_rows: int = 1):
+    """Queue a debounced background retrain; see TrainingScheduler.
+
+    A no-op with the online model, which learns inside each insert.
+    """
+    if not online_model.ONLINE_ENABLED:
+        _scheduler.schedule(user_id, loader, new_rows)
+
+
+def forget_user_model(user_id: str):
+    """Cancel pending retrains and delete the user's stored model (after their data is cleared)."""
+    _scheduler.cancel(user_id)
+    _registry.delete(user_id)
+
+
+def training_stats() -> dict:
+    return {**_scheduler.stats(), "models": _registry.stats()}
+
+
+def shutdown_training(wait: bool = True):
+    _scheduler.shutdown(wait)
+
+
+def online_sample(hour, weekday, amount, category, impulse_score) -> tuple[list[float], int]:
+    """(features, label) of one transaction for the online model."""
+    x = online_model.features(hour, weekday, amount, CATEGORY_RISK.get(category, 0.4))
+    return x, 1 if (impulse_score or 0) >= 55 else 0
+
+
+def ml_impulse_probability(user_id, amount, category, timestamp_str, online=None):
+    """Get ML model prediction if available.
+
+    With VIBESHIELD_ML_MODEL=online, ``online`` is the user's OnlineLogit
+    (UserSnapshot.online_model); otherwise the user's forest is used.
+    """
+    if online_model.ONLINE_ENABLED:
+        if online is None or online.n < online_model.MIN_SAMPLES:
+            return None
+        ts = datetime.fromisoformat(timestamp_str)
+        x, _ = online_sample(ts.hour, ts.weekday(), amount, category, 0)
+        return online.predict_proba(x)
+    model = _registry.get(user_id)
     if not model:
         return None
     ts = datetime.fromisoformat(timestamp_str)
     try:
-        import numpy as _np
-        prob = model.predict_proba(
-            _np.array([[ts.hour, ts.weekday(), amount,
-                       CATEGORY_RISK.get(category, 0.4)]])
-        )[0]
+        prob = model.predict_proba_one(
+            [ts.hour, ts.weekday(), amount, CATEGORY_RISK.get(category, 0.4)])
         return float(prob[1]) if len(prob) > 1 else float(prob[0])
     except Exception:
         return None
@@ -0,0 +1,148 @@
+"""
+Keyword → category matching for free-text item descriptions.
+
+An Aho–Corasick automaton finds every keyword occurring in the text in a
+single pass. Precedence is deterministic:
+
+  1. the whole text is a keyword
+  2. the longest keyword found in the text (then leftmost, then first added)
+  3. partial typing: the shortest keyword containing the text ("pizz" → pizza)
+
+The automaton is immutable once published, so lookups need no lock.
+Adding a keyword builds a successor off to the side (sharing every trie
+node it does not touch) and swaps it in with one assignment; the result
+cache belongs to the automaton, so a lookup still running on the old one
+can never leave a stale answer behind.
+"""
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Iterable, Optional
+
+
+class _Automaton:
+    """One immutable keyword set: trie, failure/output links, partial map and result cache."""
+
+    def __init__(self, goto: list[dict[str, int]], out: list[int], keywords: list[tuple[str, str]],
+                 index: dict[str, int], partial: dict[str, int], cache_size: int):
+        self.goto = goto
+        self.out = out                 # keyword index ending at node, -1 if none
+        self.keywords = keywords
+        self.index = index
+        self.partial = partial         # substring → shortest keyword containing it
+        self.fail, self.out_link = self._link()
+        self.detect = lru_cache(maxsize=cache_size)(self._detect)
+
+    @classmethod
+    def empty(cls, cache_size: int) -> "_Automaton":
+        return cls([{}], [-1], [], {}, {}, cache_size)
+
+    def extended(self, items: Iterable[tuple[str, str]], cache_size: int) -> "_Automaton":
+        """A new automaton with ``items`` (normalized keyword, category) added or re-mapped."""
+        goto, out = list(self.goto), list(self.out)
+        keywords, index, partial = list(self.keywords), dict(self.index), dict(self.partial)
+        owned: set[int] = set()        # nodes whose dict is ours to mutate
+        for kw, category in items:
+            idx = index.get(kw)
+            if idx is not None:
+                keywords[idx] = (kw, category)
+                continue
+            idx = index[kw] = len(keywords)
+            keywords.append((kw, category))
+            node = 0
+            for ch in kw:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    if node not in owned:
+                        goto[node] = dict(goto[node])
+                        owned.add(node)
+                    nxt = goto[node][ch] = len(goto)
+                    goto.append({})
+                    out.append(-1)
+                    owned.add(nxt)
+                node = nxt
+            out[node] = idx
+            for i in range(len(kw)):
+                for j in range(i + 1, len(kw) + 1):
+                    best = partial.get(kw[i:j])
+                    if best is None or len(kw) < len(keywords[best][0]):
+                        partial[kw[i:j]] = idx
+        return _Automaton(goto, out, keywords, index, partial, cache_size)
+
+    def _link(self) -> tuple[list[int], list[int]]:
+        """Failure and output links (nearest failure ancestor with an output, 0 = none), breadth-first."""
+        goto, out = self.goto, self.out
+        fail, out_link = [0] * len(goto), [0] * len(goto)
+        todo = deque(goto[0].values())
+        while todo:
+            node = todo.popleft()
+            for ch, child in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                fail[child] = f
+                out_link[child] = f if out[f] >= 0 else out_link[f]
+                todo.append(child)
+        return fail, out_link
+
+    def find_all(self, text: str) -> list[tuple[int, str, str]]:
+        goto, fail, out, out_link = self.goto, self.fail, self.out, self.out_link
+        hits = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            m = node if out[node] >= 0 else out_link[node]
+            while m:
+                kw, cat = self.keywords[out[m]]
+                hits.append((i - len(kw) + 1, kw, cat))
+                m = out_link[m]
+        return hits
+
+    def _detect(self, text: str) -> Optional[str]:
+        idx = self.index.get(text)
+        if idx is None:
+            hits = self.find_all(text)
+            if hits:
+                _, kw, _ = min(hits, key=lambda h: (-len(h[1]), h[0], self.index[h[1]]))
+                idx = self.index[kw]
+            else:
+                idx = self.partial.get(text)
+        return None if idx is None else self.keywords[idx][1]
+
+
+class KeywordMatcher:
+    """Multi-keyword matcher with longest-match precedence and an LRU result cache."""
+
+    def __init__(self, keywords: dict[str, str] = None, cache_size: int = 2048):
+        self._cache_size = cache_size
+        self._lock = threading.Lock()    # serializes writers only
+        self._automaton = _Automaton.empty(cache_size).extended(
+            ((self._normalize(kw), cat) for kw, cat in (keywords or {}).items()), cache_size)
+
+    def __len__(self):
+        return len(self._automaton.keywords)
+
+    @staticmethod
+    def _normalize(keyword: str) -> str:
+        kw = keyword.lower().strip()
+        if not kw:
+            raise ValueError("keyword must not be empty")
+        return kw
+
+    def add(self, keyword: str, category: str):
+        """Add (or re-map) a keyword; lookups switch to the new set atomically."""
+        kw = self._normalize(keyword)
+        with self._lock:
+            self._automaton = self._automaton.extended([(kw, category)], self._cache_size)
+
+    def find_all(self, text: str) -> list[tuple[int, str, str]]:
+        """Every keyword occurrence in ``text`` (already lowercased) as (start, keyword, category)."""
+        return self._automaton.find_all(text)
+
+    def detect(self, text: str) -> Optional[str]:
+        """Category for free text, or None if nothing matches."""
+        text = text.lower().strip()
+        return self._automaton.detect(text) if text else None
@@ -0,0 +1,187 @@
+"""
+Per-user model registry — trained models persisted to disk, cached in memory.
+
+Each model file holds two pickles: a small header (format version,
+training-data watermark, size) followed by the model itself, so checking
+whether a stored model is current never unpickles the model. Loaded models
+are kept in an LRU bounded by count and by pickled bytes; users without a
+model are remembered for a short while so scoring them skips the disk.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Bump when the feature layout or model type changes; older files are ignored
+MODEL_FORMAT_VERSION = 2   # 2: compiled forests (app.ml.tree_compiler)
+
+if os.environ.get("VERCEL"):
+    MODEL_DIR = "/tmp/vibeshield-models"
+else:
+    MODEL_DIR = os.environ.get(
+        "VIBESHIELD_MODEL_DIR",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "models"))
+
+MODEL_CACHE_SIZE = int(os.environ.get("VIBESHIELD_MODEL_CACHE_SIZE", "256"))
+MODEL_CACHE_BYTES = int(float(os.environ.get("VIBESHIELD_MODEL_CACHE_MB", "64")) * 1024 * 1024)
+# Users known to have no model; the TTL bounds how long another worker's new model goes unseen
+MISSING_CACHE_SIZE = 4096
+MISSING_TTL_S = 30.0
+
+
+class ModelRegistry:
+    """Disk-backed store of one model per user with a bounded in-memory LRU."""
+
+    def __init__(self, directory: str = MODEL_DIR, max_models: int = MODEL_CACHE_SIZE,
+                 max_bytes: int = MODEL_CACHE_BYTES):
+        self.directory = directory
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._cache: "OrderedDict[str, tuple[object, dict]]" = OrderedDict()
+        self._bytes = 0
+        self._missing: "OrderedDict[str, float]" = OrderedDict()   # user_id -> expiry (monotonic)
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.hits = self.loads = self.evictions = self.missing_hits = 0
+
+    def _path(self, user_id: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(user_id.encode()).hexdigest()[:32] + ".pkl")
+
+    # ─── Read ───
+
+    def get(self, user_id: str):
+        """The user's model, loaded from disk on first use; None if there is none."""
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is not None:
+                self._cache.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            if self._known_missing(user_id):
+                self.missing_hits += 1
+                return None
+            writes = self._writes
+        loaded = self._load(user_id)
+        if loaded is None:
+            with self._lock:
+                # A put/delete that ran meanwhile may have made this miss stale
+                if self._writes == writes:
+                    self._mark_missing(user_id)
+            return None
+        model, header = loaded
+        with self._lock:
+            self.loads += 1
+            self._remember(user_id, model, header)
+        return model
+
+    def watermark(self, user_id: str) -> Optional[tuple]:
+        """Training-data watermark of the stored model (header only, no unpickling of the model)."""
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is not None:
+                return entry[1]["watermark"]
+            if self._known_missing(user_id):
+                return None
+        header = self._read_header(user_id)
+        return header["watermark"] if header else None
+
+    def _read_header(self, user_id: str) -> Optional[dict]:
+        try:
+            with open(self._path(user_id), "rb") as f:
+                header = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if not isinstance(header, dict) or header.get("version") != MODEL_FORMAT_VERSION:
+            return None
+        header["watermark"] = tuple(header["watermark"])
+        return header
+
+    def _load(self, user_id: str) -> Optional[tuple]:
+        try:
+            with open(self._path(user_id), "rb") as f:
+                header = pickle.load(f)
+                if not isinstance(header, dict) or header.get("version") != MODEL_FORMAT_VERSION:
+                    return None
+                model = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        header["watermark"] = tuple(header["watermark"])
+        return model, header
+
+    # ─── Write ───
+
+    def put(self, user_id: str, model, watermark: tuple):
+        """Persist ``model`` atomically, then make it the user's current model."""
+        blob = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        header = {"version": MODEL_FORMAT_VERSION, "watermark": tuple(watermark),
+                  "trained_at": time.time(), "size": len(blob)}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    f.write(blob)
+                os.replace(tmp, self._path(user_id))
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            pass  # read-only or full disk: keep serving from memory
+        with self._lock:
+            self._remember(user_id, model, header)
+
+    def delete(self, user_id: str):
+        with self._lock:
+            self._forget(user_id)
+            self._missing.pop(user_id, None)
+            self._writes += 1
+        try:
+            os.remove(self._path(user_id))
+        except OSError:
+            pass
+
+    # ─── LRU ───
+
+    def _remember(self, user_id: str, model, header: dict):
+        # caller holds self._lock
+        self._forget(user_id)
+        self._missing.pop(user_id, None)
+        self._writes += 1
+        self._cache[user_id] = (model, header)
+        self._bytes += header["size"]
+        while len(self._cache) > 1 and (len(self._cache) > self.max_models or self._bytes > self.max_bytes):
+            self._forget(next(iter(self._cache)))
+            self.evictions += 1
+
+    def _forget(self, user_id: str):
+        entry = self._cache.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]["size"]
+
+    def _known_missing(self, user_id: str) -> bool:
+        # caller holds self._lock
+        expiry = self._missing.get(user_id)
+        if expiry is None:
+            return False
+        if expiry <= time.monotonic():
+            del self._missing[user_id]
+            return False
+        return True
+
+    def _mark_missing(self, user_id: str):
+        # caller holds self._lock
+        self._missing[user_id] = time.monotonic() + MISSING_TTL_S
+        self._missing.move_to_end(user_id)
+        while len(self._missing) > MISSING_CACHE_SIZE:
+            self._missing.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cached": len(self._cache), "cached_bytes": self._bytes, "hits": self.hits,
+                    "loads": self.loads, "evictions": self.evictions,
+                    "missing": len(self._missing), "missing_hits": self.missing_hits}
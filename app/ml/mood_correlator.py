@@ -1,6 +1,16 @@
 """Mood-to-Money Correlation Engine — links emotional states to spending."""
-from datetime import datetime, timedelta
-from collections import defaultdict
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from collections import OrderedDict, defaultdict, deque
+from itertools import chain
+from typing import Optional
+
+from app.timefields import HOUR_US, row_time
+
+# Spending within ± this many hours of a mood check-in is attributed to it
+MOOD_WINDOW_HOURS = float(os.environ.get("VIBESHIELD_MOOD_WINDOW_HOURS", "6"))
 
 
 def _mean(lst):
@@ -12,36 +22,199 @@ MOOD_EMOJIS = {
 }
 
 
-def correlate(transactions, moods):
-    """Correlate moods with spending in ±6 hour windows."""
+class SpendIndex:
+    """Transactions sorted once by time, for window lookups by bisect.
+
+    Finding a window's transactions is two bisects, so correlating M moods
+    with N transactions is O(N log N + M (log N + k)) for k transactions per
+    window, instead of O(M × N). Amounts inside a window are added in the
+    caller's original order, so totals are bit-identical to summing the
+    matching rows of ``transactions`` in a loop.
+    """
+
+    __slots__ = ("_epochs", "_amounts", "_categories", "_positions", "_input_descending")
+
+    def __init__(self, transactions):
+        rows = []
+        for t in transactions:
+            try:
+                rows.append((row_time(t)[0], len(rows), t["amount"], t["category"]))
+            except Exception:
+                pass
+        # Input is normally newest first (ORDER BY timestamp DESC); then the
+        # input order of any window is simply its sorted slice reversed
+        self._input_descending = all(a[0] >= b[0] for a, b in zip(rows, rows[1:]))
+        rows.sort(key=lambda r: (r[0], -r[1]))
+        self._epochs = [r[0] for r in rows]
+        self._positions = [r[1] for r in rows]
+        self._amounts = [r[2] for r in rows]
+        self._categories = [r[3] for r in rows]
+
+    def __len__(self):
+        return len(self._epochs)
+
+    def _window(self, start_us: int, end_us: int) -> list[int]:
+        """Indices of rows with start_us <= epoch_us <= end_us, in input order."""
+        lo = bisect_left(self._epochs, start_us)
+        hi = bisect_right(self._epochs, end_us, lo)
+        if self._input_descending:
+            return list(range(hi - 1, lo - 1, -1))
+        return sorted(range(lo, hi), key=self._positions.__getitem__)
+
+    def transactions(self, start_us: int, end_us: int) -> list[tuple[float, str]]:
+        """(amount, category) of every transaction in the window, in input order."""
+        amounts, categories = self._amounts, self._categories
+        return [(amounts[i], categories[i]) for i in self._window(start_us, end_us)]
+
+
+class SpendStream:
+    """Sliding window over transactions streamed newest first by epoch_us.
+
+    Answers the same window queries as SpendIndex, provided they arrive
+    newest first too (moods in the same order): rows are pulled from the
+    iterator only as far as the current window reaches and dropped once it
+    has moved past them, so memory is bounded by one window. Input out of
+    epoch order raises ValueError rather than silently mis-summing.
+    """
+
+    __slots__ = ("_rows", "_pending", "_window", "_last_epoch", "_last_end")
+
+    def __init__(self, transactions):
+        self._rows = iter(transactions)
+        self._pending = None               # next row, older than the current window
+        self._window: deque = deque()      # (epoch_us, amount, category), newest first
+        self._last_epoch = self._last_end = None
+
+    def transactions(self, start_us: int, end_us: int) -> list[tuple[float, str]]:
+        """(amount, category) of every transaction in the window, newest first."""
+        if self._last_end is not None and end_us > self._last_end:
+            raise ValueError("SpendStream windows must be queried newest first")
+        self._last_end = end_us
+        window = self._window
+        while True:
+            if self._pending is None:
+                t = next(self._rows, None)
+                if t is None:
+                    break
+                epoch_us = t.get("epoch_us")
+                if epoch_us is None:            # no usable time: skipped, as row_time() fails
+                    continue
+                if self._last_epoch is not None and epoch_us > self._last_epoch:
+                    raise ValueError("SpendStream needs transactions newest first by epoch_us")
+                self._last_epoch = epoch_us
+                self._pending = (epoch_us, t["amount"], t["category"])
+            if self._pending[0] < start_us:
+                break
+            window.append(self._pending)
+            self._pending = None
+        while window and window[0][0] > end_us:
+            window.popleft()
+        return [(amt, cat) for _, amt, cat in window]
+
+
+def correlate(transactions, moods, window_hours: float = MOOD_WINDOW_HOURS, cache_key: str = None,
+              newest_first: bool = False, version=None):
+    """Correlate moods with spending in ±window_hours windows."""
+    result = analyze_moods(transactions, moods, window_hours, cache_key, newest_first, version)
+    del result["category_map"]
+    return result
+
+
+def get_mood_category_map(transactions, moods, window_hours: float = MOOD_WINDOW_HOURS):
+    """Which categories do users spend on when in each mood?"""
+    return analyze_moods(transactions, moods, window_hours)["category_map"]
+
+
+# ─── Unified pass ───
+
+MOOD_CACHE_SIZE = int(os.environ.get("VIBESHIELD_MOOD_CACHE_SIZE", "256"))
+
+_cache: "OrderedDict[str, tuple[tuple, dict]]" = OrderedDict()   # cache_key → (fingerprint, result)
+_cache_lock = threading.Lock()
+
+
+def _fingerprint(transactions, moods, window_hours: float) -> Optional[tuple]:
+    # Stored rows never change except was_cancelled, which moves a row in or
+    # out of the committed list, so the ids fully determine the result
+    try:
+        return window_hours, tuple(t["id"] for t in transactions), tuple(m["id"] for m in moods)
+    except KeyError:
+        return None
+
+
+def analyze_moods(transactions, moods, window_hours: float = MOOD_WINDOW_HOURS, cache_key: str = None,
+                  newest_first: bool = False, version=None) -> dict:
+    """correlate() plus the mood × category map, from one pass over the mood windows.
+
+    ``newest_first``: both inputs are ordered newest first by epoch_us (as
+    database.iter_transactions / iter_moods yield them) and may be any
+    iterables; they are consumed as streams, transactions in memory bounded
+    by one window.
+
+    With ``cache_key`` (the user id) the result is kept per user against
+    ``version`` (e.g. database.get_data_version) or, for lists, the ids of
+    the rows passed in, so repeat views of unchanged data cost a
+    comparison. Always returns a fresh top-level dict.
+    """
+    fingerprint = None
+    if cache_key is not None:
+        if version is not None:
+            fingerprint = (window_hours, version)
+        elif not newest_first:
+            fingerprint = _fingerprint(transactions, moods, window_hours)
+    if fingerprint is not None:
+        with _cache_lock:
+            hit = _cache.get(cache_key)
+            if hit is not None and hit[0] == fingerprint:
+                _cache.move_to_end(cache_key)
+                return dict(hit[1])
+    result = _analyze_moods(transactions, moods, window_hours, newest_first)
+    if fingerprint is not None:
+        with _cache_lock:
+            _cache[cache_key] = (fingerprint, result)
+            _cache.move_to_end(cache_key)
+            while len(_cache) > MOOD_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return dict(result)
+
+
+def _peeked(rows):
+    """``rows`` as an iterator, or None when it is empty."""
+    rows = iter(rows)
+    first = next(rows, None)
+    return None if first is None else chain((first,), rows)
+
+
+def _analyze_moods(transactions, moods, window_hours: float, newest_first: bool) -> dict:
+    if newest_first:
+        transactions, moods = _peeked(transactions), _peeked(moods)
     if not moods or not transactions:
         return {
             "mood_spend": {}, "mood_count": {}, "baseline_avg": 0,
             "insights": ["Log some moods and make transactions to see how emotions affect your spending!"],
             "mood_timeline": [],
+            "category_map": {},
         }
 
-    tx_by_ts = []
-    for t in transactions:
-        try:
-            tx_by_ts.append((datetime.fromisoformat(t["timestamp"]), t["amount"], t["category"]))
-        except Exception:
-            pass
+    index = SpendStream(transactions) if newest_first else SpendIndex(transactions)
+    half_window = int(window_hours * HOUR_US)
 
     mood_totals: dict[str, list[float]] = defaultdict(list)
+    category_map: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
     timeline = []
 
     for m in moods:
         try:
-            mts = datetime.fromisoformat(m["timestamp"])
+            m_us = row_time(m)[0]
         except Exception:
             continue
-        ws = mts - timedelta(hours=6)
-        we = mts + timedelta(hours=6)
-        spend = sum(amt for ts, amt, _ in tx_by_ts if ws <= ts <= we)
+        window = index.transactions(m_us - half_window, m_us + half_window)
+        spend = sum(amt for amt, _ in window)
+        for amt, cat in window:
+            category_map[m["mood"]][cat] += amt
         mood_totals[m["mood"]].append(spend)
         timeline.append({
-            "date": mts.strftime("%Y-%m-%d %H:%M"),
+            "date": datetime.fromisoformat(m["timestamp"]).strftime("%Y-%m-%d %H:%M"),
             "mood": m["mood"],
             "emoji": m.get("emoji", MOOD_EMOJIS.get(m["mood"], "🔵")),
             "spend": round(spend, 0),
@@ -74,28 +247,5 @@ def correlate(transactions, moods):
         "baseline_avg": round(baseline, 0),
         "insights": insights,
         "mood_timeline": sorted(timeline, key=lambda x: x["date"]),
+        "category_map": {mood: {c: round(v, 0) for c, v in cats.items()} for mood, cats in category_map.items()},
     }
-
-
-def get_mood_category_map(transactions, moods):
-    """Which categories do users spend on when in each mood?"""
-    if not moods or not transactions:
-        return {}
-    tx = []
-    for t in transactions:
-        try:
-            tx.append((datetime.fromisoformat(t["timestamp"]), t["amount"], t["category"]))
-        except Exception:
-            pass
-    result: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
-    for m in moods:
-        try:
-            mts = datetime.fromisoformat(m["timestamp"])
-        except Exception:
-            continue
-        ws = mts - timedelta(hours=6)
-        we = mts + timedelta(hours=6)
-        for ts, amt, cat in tx:
-            if ws <= ts <= we:
-                result[m["mood"]][cat] += amt
-    return {mood: {c: round(v, 0) for c, v in cats.items()} for mood, cats in result.items()}
@@ -0,0 +1,67 @@
+"""
+Online impulse model — streaming logistic regression.
+
+An alternative to refitting a RandomForest over the whole history: one
+AdaGrad step per transaction, O(1) in time and state. It uses the same
+[hour, weekday, amount, category_risk] inputs and label (impulse_score >= 55)
+as the forest. The hour is encoded on a circle so 23:00 and 01:00 are
+neighbours, and the amount is log-scaled.
+
+Selected with VIBESHIELD_ML_MODEL=online (default: forest). The state is
+stored per user in the ``online_models`` table and updated inside the same
+write transaction as the transaction it learns from.
+"""
+import json
+import math
+import os
+
+ML_MODEL = os.environ.get("VIBESHIELD_ML_MODEL", "forest").lower()
+ONLINE_ENABLED = ML_MODEL == "online"
+
+# Same minimum as the forest before predictions are served
+MIN_SAMPLES = 15
+
+_N_FEATURES = 6   # bias, sin(hour), cos(hour), weekday, log amount, category risk
+
+
+def features(hour: int, weekday: int, amount: float, category_risk: float) -> list[float]:
+    angle = 2 * math.pi * hour / 24
+    return [1.0, math.sin(angle), math.cos(angle), weekday / 6,
+            math.log1p(max(amount, 0.0)) / 10, category_risk]
+
+
+class OnlineLogit:
+    """Logistic regression trained one sample at a time with AdaGrad."""
+
+    __slots__ = ("weights", "grad_sq", "n")
+
+    LEARNING_RATE = 0.5
+    L2 = 1e-4
+
+    def __init__(self, weights=None, grad_sq=None, n: int = 0):
+        self.weights = list(weights) if weights else [0.0] * _N_FEATURES
+        self.grad_sq = list(grad_sq) if grad_sq else [0.0] * _N_FEATURES
+        self.n = n
+
+    def predict_proba(self, x: list[float]) -> float:
+        z = sum(w * v for w, v in zip(self.weights, x))
+        if z >= 0:
+            return 1 / (1 + math.exp(-z))
+        e = math.exp(z)
+        return e / (1 + e)
+
+    def update(self, x: list[float], label: int):
+        err = self.predict_proba(x) - label
+        for i, v in enumerate(x):
+            g = err * v + self.L2 * self.weights[i]
+            self.grad_sq[i] += g * g
+            self.weights[i] -= self.LEARNING_RATE * g / (math.sqrt(self.grad_sq[i]) + 1e-8)
+        self.n += 1
+
+    def dumps(self) -> str:
+        return json.dumps({"w": self.weights, "g": self.grad_sq, "n": self.n})
+
+    @classmethod
+    def loads(cls, state: str) -> "OnlineLogit":
+        d = json.loads(state)
+        return cls(d["w"], d["g"], d["n"])
@@ -0,0 +1,103 @@
+"""
+Forest compiler — a trained RandomForestClassifier as packed NumPy arrays.
+
+All trees are concatenated into flat node arrays (feature, threshold,
+left, right, leaf probabilities), so serving a prediction needs neither
+sklearn nor its per-call validation overhead. Results are bit-identical to
+``predict_proba``:
+
+  * inputs are rounded to float32 first, as sklearn does, then compared
+    ``x <= threshold`` against the float64 thresholds
+  * each leaf holds its tree's normalised class distribution
+  * per-tree probabilities are summed in estimator order, then divided
+    by the number of trees
+"""
+import numpy as np
+
+_LEAF = -1
+
+
+class CompiledForest:
+    """Flattened forest; picklable with numpy alone."""
+
+    __slots__ = ("classes", "n_trees", "roots", "feature", "threshold", "left", "right", "value",
+                 "_lists")
+
+    def __init__(self, classes, roots, feature, threshold, left, right, value):
+        self.classes = np.asarray(classes)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.n_trees = len(self.roots)
+        self.feature = np.asarray(feature, dtype=np.int64)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int64)
+        self.right = np.asarray(right, dtype=np.int64)
+        self.value = np.asarray(value, dtype=np.float64)
+        self._lists = None
+
+    def __getstate__(self):
+        return {k: getattr(self, k) for k in self.__slots__ if k != "_lists"}
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+        self._lists = None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, k).nbytes for k in ("roots", "feature", "threshold", "left", "right", "value"))
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Class probabilities for a batch, shape (n_rows, n_classes)."""
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        while True:
+            internal = self.left[nodes] != _LEAF
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, self.left[nodes], self.right[nodes]), nodes)
+        leaves = self.value[nodes]                       # (n_rows, n_trees, n_classes)
+        proba = np.zeros((len(X), self.value.shape[1]))
+        for t in range(self.n_trees):
+            proba += leaves[:, t]
+        proba /= self.n_trees
+        return proba
+
+    def predict_proba_one(self, x) -> list[float]:
+        """Class probabilities for a single row, without building arrays."""
+        if self._lists is None:
+            self._lists = (self.roots.tolist(), self.feature.tolist(), self.threshold.tolist(),
+                           self.left.tolist(), self.right.tolist(), self.value.tolist())
+        roots, feature, threshold, left, right, value = self._lists
+        x = np.asarray(x, dtype=np.float32).tolist()
+        proba = [0.0] * len(value[0])
+        for node in roots:
+            while left[node] != _LEAF:
+                node = left[node] if x[feature[node]] <= threshold[node] else right[node]
+            for k, v in enumerate(value[node]):
+                proba[k] += v
+        return [p / self.n_trees for p in proba]
+
+
+def compile_forest(forest) -> CompiledForest:
+    """Flatten a fitted sklearn RandomForestClassifier (single output)."""
+    roots, feature, threshold, left, right, value = [], [], [], [], [], []
+    offset = 0
+    for est in forest.estimators_:
+        tree = est.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == _LEAF
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        left.append(np.where(is_leaf, _LEAF, tree.children_left + offset))
+        right.append(np.where(is_leaf, _LEAF, tree.children_right + offset))
+        # DecisionTreeClassifier.predict_proba: leaf value / its row sum (0 → 1)
+        v = tree.value[:, 0, :].astype(np.float64)
+        norm = v.sum(axis=1)[:, None]
+        norm[norm == 0.0] = 1.0
+        value.append(v / norm)
+        offset += n
+    return CompiledForest(forest.classes_, roots, np.concatenate(feature), np.concatenate(threshold),
+                          np.concatenate(left), np.concatenate(right), np.concatenate(value))
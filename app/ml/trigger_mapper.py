@@ -1,27 +1,180 @@
 """Trigger Mapping AI — personal spending pattern analysis per user."""
-from datetime import datetime
-from collections import defaultdict
+from app.ml.history import CANCELLED, UserHistory
+from app.timefields import row_time
 
 
 def _mean(lst):
     return sum(lst) / len(lst) if lst else 0
 
 
-def build_heatmap(transactions: list[dict]) -> list[list[float]]:
+class TriggerAccumulator:
+    """Every trigger-map statistic, from one pass over the transactions.
+
+    Rows can be added incrementally (``add``/``update``) and accumulators
+    built over separate partitions combined with ``merge``. All outputs
+    (heatmap, category × hour, top categories, weekend ratio, insights) are
+    derived from the running sums, so each row is read exactly once.
+    Sums are accumulated in ingestion order; merged partitions may differ
+    from a single pass in the last float bit.
+    """
+
+    __slots__ = ("grid", "cat_hours", "cat_totals", "late", "we_sum", "we_n", "wd_sum", "wd_n",
+                 "n", "high_n", "cancelled_n", "saved")
+
+    def __init__(self):
+        self.grid = [[0.0] * 24 for _ in range(7)]            # weekday × hour amount
+        self.cat_hours: dict[str, list[float]] = {}           # category → 24 hourly amounts
+        self.cat_totals: dict[str, float] = {}                # category → amount
+        self.late: dict[str, float] = {}                      # category → amount 22:00–04:59
+        self.we_sum = self.wd_sum = 0.0
+        self.we_n = self.wd_n = 0
+        self.n = self.high_n = self.cancelled_n = 0
+        self.saved = 0
+
+    def add(self, weekday: int, hour: int, amount: float, category: str,
+            impulse_score: float = 0, cancelled: bool = False):
+        """Ingest one transaction.
+
+        Rows without a usable time (weekday/hour -1, as in UserHistory) count
+        towards totals and categories but not the time-based buckets, like
+        the rollup tables, which only bucket rows with an hour.
+        """
+        if hour >= 0:
+            self.grid[weekday][hour] += amount
+            hours = self.cat_hours.get(category)
+            if hours is None:
+                hours = self.cat_hours[category] = [0.0] * 24
+            hours[hour] += amount
+            if hour >= 22 or hour <= 4:
+                self.late[category] = self.late.get(category, 0.0) + amount
+            if weekday >= 5:
+                self.we_sum, self.we_n = self.we_sum + amount, self.we_n + 1
+            else:
+                self.wd_sum, self.wd_n = self.wd_sum + amount, self.wd_n + 1
+        self.cat_totals[category] = self.cat_totals.get(category, 0.0) + amount
+        self.n += 1
+        if impulse_score >= 55:
+            self.high_n += 1
+        if cancelled:
+            self.cancelled_n += 1
+            self.saved += amount
+
+    def update(self, transactions) -> "TriggerAccumulator":
+        """Ingest a UserHistory or any iterable of transaction dicts, in order.
+
+        Dicts are consumed one at a time, so a generator such as
+        database.iter_transactions() is aggregated in constant memory.
+        """
+        add = self.add
+        if isinstance(transactions, UserHistory):
+            names = transactions.categories
+            for weekday, hour, amount, code, score, flags in zip(
+                    transactions.weekdays, transactions.hours, transactions.amounts,
+                    transactions.category_codes, transactions.scores, transactions.flags):
+                add(weekday, hour, amount, names[code], score, flags & CANCELLED)
+            return self
+        for t in transactions or ():
+            try:
+                _, hour, weekday, _ = row_time(t)
+            except Exception:
+                hour = weekday = -1          # as UserHistory stores rows without a time
+            add(weekday, hour, t["amount"], t["category"], t.get("impulse_score", 0) or 0,
+                bool(t.get("was_cancelled")))
+        return self
+
+    def merge(self, other: "TriggerAccumulator") -> "TriggerAccumulator":
+        """Fold another partition's accumulator into this one."""
+        for row, other_row in zip(self.grid, other.grid):
+            for hour, amount in enumerate(other_row):
+                row[hour] += amount
+        for cat, other_hours in other.cat_hours.items():
+            hours = self.cat_hours.setdefault(cat, [0.0] * 24)
+            for hour, amount in enumerate(other_hours):
+                hours[hour] += amount
+        for mine, theirs in ((self.cat_totals, other.cat_totals), (self.late, other.late)):
+            for cat, amount in theirs.items():
+                mine[cat] = mine.get(cat, 0.0) + amount
+        self.we_sum += other.we_sum
+        self.we_n += other.we_n
+        self.wd_sum += other.wd_sum
+        self.wd_n += other.wd_n
+        self.n += other.n
+        self.high_n += other.high_n
+        self.cancelled_n += other.cancelled_n
+        self.saved += other.saved
+        return self
+
+    @classmethod
+    def from_rollup(cls, rollup: dict) -> "TriggerAccumulator":
+        """Accumulator over rollup cells — O(cells), not O(transactions).
+
+        ``rollup`` is the shape returned by ``database.get_trigger_rollup``.
+        """
+        acc = cls()
+        for weekday, hour, amount, count in rollup["hours"]:
+            acc.grid[weekday][hour] += amount
+            if weekday >= 5:
+                acc.we_sum, acc.we_n = acc.we_sum + amount, acc.we_n + count
+            else:
+                acc.wd_sum, acc.wd_n = acc.wd_sum + amount, acc.wd_n + count
+        for cat, hour, amount, _ in rollup["cat_hours"]:
+            acc.cat_hours.setdefault(cat, [0.0] * 24)[hour] += amount
+            if hour >= 22 or hour <= 4:
+                acc.late[cat] = acc.late.get(cat, 0.0) + amount
+        for cat, amount, _ in rollup["categories"]:
+            acc.cat_totals[cat] = amount
+        totals = rollup["totals"]
+        acc.n = totals["tx_count"]
+        acc.high_n = totals["high_risk_count"]
+        acc.cancelled_n = totals["cancelled_count"]
+        acc.saved = totals["cancelled_amount"]
+        return acc
+
+    # ─── Outputs ───
+
+    def heatmap(self) -> list[list[float]]:
+        """7 × 24 grid: rows = Mon–Sun, cols = hours."""
+        return [[round(v, 0) for v in row] for row in self.grid]
+
+    def category_by_hour(self) -> dict:
+        return {k: [round(v, 0) for v in lst] for k, lst in self.cat_hours.items()}
+
+    def top_categories(self, n=5):
+        return sorted(self.cat_totals.items(), key=lambda x: x[1], reverse=True)[:n]
+
+    def late_night_category(self):
+        return max(self.late, key=self.late.get) if self.late else None
+
+    def weekend_ratio(self):
+        return _ratio(self.we_sum, self.we_n, self.wd_sum, self.wd_n)
+
+    def insights(self, heatmap=None) -> list[str]:
+        if self.n < 3:
+            return _insights(self.n, None, None, 0, None, 0, 0, 0)
+        return _insights(self.n, heatmap or self.heatmap(), self.late_night_category(),
+                         self.weekend_ratio(), self.top_categories(), self.high_n,
+                         self.cancelled_n, self.saved)
+
+    def result(self) -> dict:
+        """The get_trigger_data() response."""
+        heatmap = self.heatmap()
+        return {
+            "heatmap": heatmap,
+            "category_by_hour": self.category_by_hour(),
+            "top_categories": self.top_categories(),
+            "insights": self.insights(heatmap),
+            "weekend_ratio": self.weekend_ratio(),
+            "transaction_count": self.n,
+        }
+
+
+def build_heatmap(transactions) -> list[list[float]]:
     """7 × 24 grid: rows = Mon–Sun, cols = hours."""
-    grid = [[0.0] * 24 for _ in range(7)]
-    for t in transactions:
-        ts = datetime.fromisoformat(t["timestamp"])
-        grid[ts.weekday()][ts.hour] += t["amount"]
-    return [[round(v, 0) for v in row] for row in grid]
+    return TriggerAccumulator().update(transactions).heatmap()
 
 
-def build_category_by_hour(transactions: list[dict]) -> dict:
-    cat_hours: dict[str, list[float]] = defaultdict(lambda: [0.0] * 24)
-    for t in transactions:
-        ts = datetime.fromisoformat(t["timestamp"])
-        cat_hours[t["category"]][ts.hour] += t["amount"]
-    return {k: [round(v, 0) for v in lst] for k, lst in cat_hours.items()}
+def build_category_by_hour(transactions) -> dict:
+    return TriggerAccumulator().update(transactions).category_by_hour()
 
 
 def _peak_slot(grid):
@@ -33,77 +186,57 @@ def _peak_slot(grid):
     return best
 
 
-def _top_categories(transactions, n=5):
-    totals: dict[str, float] = defaultdict(float)
-    for t in transactions:
-        totals[t["category"]] += t["amount"]
-    return sorted(totals.items(), key=lambda x: x[1], reverse=True)[:n]
-
-
-def _late_night_cat(transactions):
-    totals: dict[str, float] = defaultdict(float)
-    for t in transactions:
-        h = datetime.fromisoformat(t["timestamp"]).hour
-        if h >= 22 or h <= 4:
-            totals[t["category"]] += t["amount"]
-    return max(totals, key=totals.get) if totals else None
-
-
-def _weekend_ratio(transactions):
-    we, wd = [], []
-    for t in transactions:
-        d = datetime.fromisoformat(t["timestamp"]).weekday()
-        (we if d >= 5 else wd).append(t["amount"])
-    avg_we = _mean(we)
-    avg_wd = _mean(wd) if wd else 1
+def _ratio(we_sum, we_n, wd_sum, wd_n):
+    avg_we = we_sum / we_n if we_n else 0
+    avg_wd = wd_sum / wd_n if wd_n else 1
     return round(avg_we / avg_wd, 1) if avg_wd > 0 else 0
 
 
-def generate_insights(transactions):
-    if len(transactions) < 3:
+def _insights(n, grid, late_night_cat, weekend_ratio, top_cats, high_n, cancelled_n, saved):
+    if n < 3:
         return ["📊 Make a few more transactions and patterns will start to emerge!"]
     insights = []
     days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    grid = build_heatmap(transactions)
     pd, ph, pv = _peak_slot(grid)
     if pv > 0:
         insights.append(
             f"🔥 Peak spending: **{days[pd]}s around {ph:02d}:00** (₹{pv:,.0f} total)")
-    lnc = _late_night_cat(transactions)
-    if lnc:
+    if late_night_cat:
         insights.append(
-            f"🌙 Late-night weakness: **{lnc.replace('_', ' ').title()}** after 10 PM")
-    r = _weekend_ratio(transactions)
+            f"🌙 Late-night weakness: **{late_night_cat.replace('_', ' ').title()}** after 10 PM")
+    r = weekend_ratio
     if r > 1.3:
         insights.append(f"📅 Weekend spending is **{r}×** your weekday average")
     elif r < 0.7 and r > 0:
         insights.append(f"📅 You actually spend **less** on weekends — good discipline!")
-    tc = _top_categories(transactions)
-    if tc:
+    if top_cats:
         insights.append(
-            f"🏷️ Top category: **{tc[0][0].replace('_', ' ').title()}** (₹{tc[0][1]:,.0f})")
-    high = [t for t in transactions if t.get("impulse_score", 0) >= 55]
-    if transactions:
-        pct = round(len(high) / len(transactions) * 100)
+            f"🏷️ Top category: **{top_cats[0][0].replace('_', ' ').title()}** (₹{top_cats[0][1]:,.0f})")
+    if n:
+        pct = round(high_n / n * 100)
         if pct > 50:
             insights.append(f"⚠️ **{pct}%** of transactions are impulse-risk — let's work on that!")
         elif pct > 20:
             insights.append(f"🔶 **{pct}%** impulse-risk rate — room for improvement")
         else:
             insights.append(f"✅ Only **{pct}%** impulse-risk — you're doing great!")
-    cancelled = [t for t in transactions if t.get("was_cancelled")]
-    if cancelled:
-        saved = sum(t["amount"] for t in cancelled)
+    if cancelled_n:
         insights.append(f"💰 You've saved **₹{saved:,.0f}** by cancelling impulse purchases!")
     return insights
 
 
+def generate_insights(transactions):
+    return TriggerAccumulator().update(transactions).insights()
+
+
 def get_trigger_data(transactions):
-    return {
-        "heatmap": build_heatmap(transactions),
-        "category_by_hour": build_category_by_hour(transactions),
-        "top_categories": _top_categories(transactions),
-        "insights": generate_insights(transactions),
-        "weekend_ratio": _weekend_ratio(transactions),
-        "transaction_count": len(transactions),
-    }
+    """Trigger analysis of a UserHistory (or a list of transaction dicts)."""
+    return TriggerAccumulator().update(transactions).result()
+
+
+def get_trigger_data_from_rollup(rollup: dict) -> dict:
+    """get_trigger_data() built from rollup cells — O(cells), not O(transactions).
+
+    ``rollup`` is the shape returned by ``database.get_trigger_rollup``.
+    """
+    return TriggerAccumulator.from_rollup(rollup).result()
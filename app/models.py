@@ -10,6 +10,19 @@ class TransactionCreate(BaseModel):
     timestamp: Optional[str] = None   # ISO string, auto-filled if None
 
 
+class TransactionDecision(TransactionCreate):
+    analysis_token: Optional[str] = None   # from /analyze; skips re-scoring while still valid
+
+
+class TransactionImport(TransactionCreate):
+    was_cancelled: bool = False
+    notes: str = ""
+
+
+class TransactionBatch(BaseModel):
+    transactions: list[TransactionImport]
+
+
 class TransactionOutcome(BaseModel):
     transaction_id: int
     was_paused: bool = False
@@ -25,6 +38,14 @@ class MoodCreate(BaseModel):
     notes: str = ""
 
 
+class MoodImport(MoodCreate):
+    timestamp: Optional[str] = None   # ISO string, auto-filled if None
+
+
+class MoodBatch(BaseModel):
+    moods: list[MoodImport]
+
+
 class SavingsGoalCreate(BaseModel):
     name: str
     target_amount: float
@@ -0,0 +1,113 @@
+"""
+Per-user response cache — versioned JSON bodies with ETag / 304.
+
+The read-only dashboard endpoints are pure functions of a user's data, so
+each encoded body is kept under (user, endpoint) together with the ETag of
+the data version it was computed from (database.get_data_version). Every
+write bumps that version, which retires the entry and the ETag at once, so
+there is nothing to invalidate explicitly. A request whose If-None-Match
+still matches is answered 304 after one primary-key lookup, without
+loading or computing anything. Bodies live in an LRU bounded by bytes.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app import database as db
+
+RESPONSE_CACHE_BYTES = int(float(os.environ.get("VIBESHIELD_RESPONSE_CACHE_MB", "16")) * 1024 * 1024)
+
+
+class ResponseCache:
+    """Latest encoded body per (user, endpoint), LRU-evicted by total bytes."""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._cache: "OrderedDict[tuple[str, str], tuple[str, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, user_id: str, endpoint: str, etag: str) -> Optional[bytes]:
+        """The cached body if it was stored under ``etag``, else None."""
+        key = (user_id, endpoint)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: str, endpoint: str, etag: str, body: bytes):
+        """Store ``body``, replacing whatever an older version left behind."""
+        key = (user_id, endpoint)
+        with self._lock:
+            self._forget(key)
+            self._cache[key] = (etag, body)
+            self._bytes += len(body)
+            while len(self._cache) > 1 and self._bytes > self.max_bytes:
+                self._forget(next(iter(self._cache)))
+                self.evictions += 1
+
+    def _forget(self, key: tuple[str, str]):
+        # caller holds self._lock
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cached": len(self._cache), "cached_bytes": self._bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+cache = ResponseCache()
+
+
+def _etag(user_id: str, endpoint: str, version: int, vary: str) -> str:
+    digest = hashlib.sha256(f"{user_id}\0{endpoint}\0{vary}".encode()).hexdigest()[:16]
+    return f'"{digest}-{version}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def _encode(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+async def cached_json(request: Request, user_id: str, endpoint: str,
+                      compute: Callable[[], Awaitable], vary: str = "") -> Response:
+    """Serve ``await compute()`` as JSON through the cache.
+
+    ``vary`` carries any input besides the user's data that the body depends
+    on (display name, today's date, ...).
+    """
+    # Read the version before computing: a write racing with compute() can
+    # only make the stored body newer than its tag, never staler
+    version = await db.run(db.get_data_version, user_id)
+    etag = _etag(user_id, endpoint, version, vary)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    body = cache.get(user_id, endpoint, etag)
+    if body is None:
+        # Encoding a large body is pure CPU: keep it off the event loop too
+        body = await db.run(_encode, await compute())
+        cache.put(user_id, endpoint, etag, body)
+    return Response(body, media_type="application/json", headers=headers)
@@ -2,8 +2,10 @@
 from fastapi import APIRouter, Request
 from datetime import datetime, timezone
 from app import database as db
+from app.response_cache import cached_json
 from app.models import SavingsGoalCreate, AccountabilityContactCreate
-from app.ml.trigger_mapper import get_trigger_data
+from app.ml.impulse_engine import forget_user_model
+from app.ml.trigger_mapper import get_trigger_data_from_rollup
 from app.ml.mood_correlator import correlate
 
 router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
@@ -20,38 +22,11 @@ async def get_stats(request: Request):
     uid, uname = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
+    return await cached_json(request, uid, "dashboard/stats", lambda: _stats(uid, uname), vary=uname)
 
-    stats = db.get_user_stats(uid)
-    txs = db.get_committed_transactions(uid)
-    all_tx = db.get_all_transactions(uid)
-    goals = db.get_savings_goals(uid)
-    contacts = db.get_accountability_contacts(uid)
-
-    # Calculate streaks and scores
-    scores = [t.get("impulse_score", 0) for t in txs]
-    avg_score = round(sum(scores) / len(scores), 1) if scores else 0
-    total_spent = round(sum(t["amount"] for t in txs), 0)
-
-    # Category breakdown for charts
-    cat_totals: dict[str, float] = {}
-    for t in txs:
-        cat_totals[t["category"]] = cat_totals.get(t["category"], 0) + t["amount"]
-
-    # Daily spending for chart (last 30 days)
-    daily: dict[str, float] = {}
-    for t in txs:
-        day = t["timestamp"][:10]
-        daily[day] = daily.get(day, 0) + t["amount"]
-
-    # Self-control streak (consecutive low-risk)
-    streak = 0
-    for t in all_tx:
-        if t.get("was_cancelled"):
-            streak += 1
-        elif t.get("impulse_score", 0) < 40:
-            streak += 1
-        else:
-            break
+
+async def _stats(uid: str, uname: str) -> dict:
+    stats = await db.run(db.get_dashboard_stats, uid)
 
     # Gamification level
     saves = stats["cancelled_count"]
@@ -68,22 +43,7 @@ async def get_stats(request: Request):
     else:
         level = {"name": "Just Starting", "emoji": "🚀", "tier": 0}
 
-    return {
-        "user_name": uname,
-        "total_transactions": stats["total_transactions"],
-        "total_spent": total_spent,
-        "money_saved": stats["money_saved"],
-        "cancelled_count": stats["cancelled_count"],
-        "avg_impulse_score": avg_score,
-        "mood_entries": stats["mood_entries"],
-        "self_control_streak": streak,
-        "level": level,
-        "category_breakdown": cat_totals,
-        "daily_spending": daily,
-        "savings_goals": goals,
-        "contacts": contacts,
-        "recent_transactions": all_tx[:10],
-    }
+    return {"user_name": uname, **stats, "level": level}
 
 
 @router.get("/triggers")
@@ -91,8 +51,11 @@ async def get_triggers(request: Request):
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    txs = db.get_all_transactions(uid)
-    return get_trigger_data(txs)
+    return await cached_json(request, uid, "dashboard/triggers", lambda: _triggers(uid))
+
+
+async def _triggers(uid: str) -> dict:
+    return get_trigger_data_from_rollup(await db.run(db.get_trigger_rollup, uid))
 
 
 @router.get("/mood-correlation")
@@ -100,9 +63,14 @@ async def get_mood_corr(request: Request):
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    txs = db.get_committed_transactions(uid)
-    moods = db.get_all_moods(uid)
-    return correlate(txs, moods)
+    return await db.run(_mood_correlation, uid)
+
+
+def _mood_correlation(uid: str) -> dict:
+    # Full history, streamed: see mood._mood_analytics
+    version = db.get_data_version(uid)
+    return correlate(db.iter_transactions(uid, committed_only=True), db.iter_moods(uid),
+                     newest_first=True, cache_key=uid, version=version)
 
 
 @router.post("/savings-goal")
@@ -110,7 +78,7 @@ async def add_savings_goal(goal: SavingsGoalCreate, request: Request):
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    gid = db.insert_savings_goal(uid, {
+    gid = await db.run(db.insert_savings_goal, uid, {
         "name": goal.name,
         "target_amount": goal.target_amount,
         "deadline": goal.deadline,
@@ -124,7 +92,7 @@ async def add_contact(contact: AccountabilityContactCreate, request: Request):
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    cid = db.insert_accountability_contact(uid, {
+    cid = await db.run(db.insert_accountability_contact, uid, {
         "name": contact.name,
         "phone": contact.phone,
         "email": contact.email,
@@ -137,5 +105,6 @@ async def clear_data(request: Request):
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    db.clear_user_data(uid)
+    await db.run(db.clear_user_data, uid)
+    await db.run(forget_user_model, uid)
     return {"status": "cleared"}
@@ -1,9 +1,12 @@
 """Mood router — per-user mood check-ins and correlation."""
+from contextlib import closing
+from itertools import islice
 from fastapi import APIRouter, Request
 from datetime import datetime, timezone
 from app import database as db
-from app.models import MoodCreate
-from app.ml.mood_correlator import correlate, get_mood_category_map, MOOD_EMOJIS
+from app.response_cache import cached_json
+from app.models import MoodCreate, MoodBatch
+from app.ml.mood_correlator import analyze_moods, MOOD_EMOJIS
 
 router = APIRouter(prefix="/api/mood", tags=["mood"])
 
@@ -18,7 +21,7 @@ async def mood_checkin(mood: MoodCreate, request: Request):
     if not uid:
         return {"error": "Not logged in"}
     ts = datetime.now(timezone.utc).isoformat()
-    mid = db.insert_mood(uid, {
+    mid = await db.run(db.insert_mood, uid, {
         "mood": mood.mood,
         "emoji": mood.emoji or MOOD_EMOJIS.get(mood.mood, "🔵"),
         "intensity": mood.intensity,
@@ -28,17 +31,42 @@ async def mood_checkin(mood: MoodCreate, request: Request):
     return {"status": "logged", "mood_id": mid, "message": "Your mood will influence future impulse detection!"}
 
 
+@router.post("/batch")
+async def mood_import(batch: MoodBatch, request: Request):
+    uid = _get_user(request)
+    if not uid:
+        return {"error": "Not logged in"}
+    now = datetime.now(timezone.utc).isoformat()
+    mids = await db.run(db.insert_moods_many, uid, ({
+        "mood": m.mood,
+        "emoji": m.emoji or MOOD_EMOJIS.get(m.mood, "🔵"),
+        "intensity": m.intensity,
+        "timestamp": m.timestamp or now,
+        "notes": m.notes,
+    } for m in batch.moods))
+    return {"status": "imported", "count": len(mids), "mood_ids": mids}
+
+
 @router.get("/correlation")
 async def get_correlation(request: Request):
     uid = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    txs = db.get_committed_transactions(uid)
-    moods = db.get_all_moods(uid)
-    result = correlate(txs, moods)
-    result["category_map"] = get_mood_category_map(txs, moods)
-    result["mood_count_total"] = len(moods)
-    result["recent_moods"] = moods[:10]
+    return await cached_json(request, uid, "mood/correlation", lambda: db.run(_mood_analytics, uid))
+
+
+def _mood_analytics(uid: str) -> dict:
+    """Correlation over the user's full history; runs on the DB executor.
+
+    Transactions and moods are both streamed; the total comes from the
+    rollup and the recent moods from the head of the same ordering.
+    """
+    version = db.get_data_version(uid)
+    result = analyze_moods(db.iter_transactions(uid, committed_only=True), db.iter_moods(uid),
+                           newest_first=True, cache_key=uid, version=version)
+    result["mood_count_total"] = db.get_user_stats(uid)["mood_entries"]
+    with closing(db.iter_moods(uid, chunk_size=10)) as moods:
+        result["recent_moods"] = list(islice(moods, 10))
     return result
 
 
@@ -47,5 +75,5 @@ async def get_recent_mood(request: Request):
     uid = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    m = db.get_recent_mood(uid)
+    m = await db.run(db.get_recent_mood, uid)
     return {"mood": m}
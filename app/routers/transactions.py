@@ -1,12 +1,16 @@
 """Transaction router — per-user analysis, commit, and outcome recording."""
+import functools
 from fastapi import APIRouter, Request
 from datetime import datetime, timezone
-from app import database as db
-from app.models import TransactionCreate, TransactionOutcome, UserSettingsUpdate
+from app import analysis_token, database as db
+from app.response_cache import cached_json
+from app.models import (
+    TransactionCreate, TransactionDecision, TransactionBatch, TransactionOutcome, UserSettingsUpdate
+)
 from app.ml.impulse_engine import (
-    calculate_impulse_score, get_lock_threshold,
+    calculate_impulse_score, calculate_impulse_scores_batch, get_lock_threshold,
     get_reflective_question, get_reflective_questions,
-    ml_impulse_probability, train_model,
+    ml_impulse_probability, schedule_training,
     detect_category_from_item, get_user_context, ITEM_TO_CATEGORY
 )
 from app.ml.regret_simulator import (
@@ -22,6 +26,28 @@ def _get_user(request: Request) -> tuple[str, str]:
     return uid, name
 
 
+def _token_inputs(tx: TransactionCreate, ts: str) -> list:
+    return [tx.amount, tx.merchant, tx.category, ts]
+
+
+async def _score(uid: str, tx: TransactionDecision, ts: str) -> tuple[float, str]:
+    """Impulse score and risk for a decided transaction.
+
+    Taken from the /analyze token when it is still valid for these inputs
+    and the user's data has not changed since; recomputed otherwise.
+    """
+    if tx.analysis_token:
+        claims = analysis_token.verify(tx.analysis_token, uid, _token_inputs(tx, ts))
+        if claims is not None and claims["v"] == await db.run(db.get_data_version, uid):
+            return claims["s"], claims["r"]
+    features = await db.run(db.get_feature_state, uid)
+    moods = await db.run(db.get_all_moods, uid, limit=20)
+    score, risk, _ = calculate_impulse_score(
+        tx.amount, tx.category, ts, None, moods, features=features
+    )
+    return score, risk
+
+
 @router.post("/analyze")
 async def analyze_transaction(tx: TransactionCreate, request: Request):
     """Analyze a transaction's impulse risk WITHOUT committing it yet."""
@@ -30,56 +56,59 @@ async def analyze_transaction(tx: TransactionCreate, request: Request):
         return {"error": "Not logged in"}
 
     ts = tx.timestamp or datetime.now(timezone.utc).isoformat()
-    history = db.get_committed_transactions(uid, limit=200)
-    all_history = db.get_all_transactions(uid, limit=200)
-    moods = db.get_all_moods(uid, limit=20)
-    goals = db.get_savings_goals(uid)
-    contacts = db.get_accountability_contacts(uid)
-    recent_mood = db.get_recent_mood(uid)
-    tx_count = db.get_transaction_count(uid)
-    settings = db.get_user_settings(uid)
+    return await db.run(_analysis, uid, uname, tx, ts)
+
+
+def _analysis(uid: str, uname: str, tx: TransactionCreate, ts: str) -> dict:
+    """The /analyze response; runs on the DB executor.
+
+    Loading the context and the scoring, questions and user context over
+    it are all blocking, so none of it runs on the event loop.
+    """
+    ctx = db.load_user_context(uid)
+    settings = ctx.settings
 
     # Apply sensitivity setting to threshold
     score, risk, factors = calculate_impulse_score(
-        tx.amount, tx.category, ts, history, moods
+        tx.amount, tx.category, ts, ctx.history, ctx.moods, features=ctx.features
     )
-    base_threshold = get_lock_threshold(tx_count)
+    base_threshold = get_lock_threshold(ctx.tx_count)
     sensitivity_offset = {"low": 8, "medium": 0, "high": -8}
     threshold = base_threshold + sensitivity_offset.get(settings.get("lock_sensitivity", "medium"), 0)
     should_lock = score >= threshold
 
     # ML model boost if available
-    ml_prob = ml_impulse_probability(uid, tx.amount, tx.category, ts)
+    ml_prob = ml_impulse_probability(uid, tx.amount, tx.category, ts, online=ctx.online_model)
 
     # Regret prediction
     regret = regret_prediction(tx.amount, tx.category)
 
     # Savings impact
-    savings_msg = savings_impact(tx.amount, goals)
+    savings_msg = savings_impact(tx.amount, ctx.goals)
 
     # AI interceptor message
     ai_msg = ai_intercept_message(
-        tx.amount, tx.category, score, goals,
-        recent_mood=recent_mood, user_name=uname, contacts=contacts
+        tx.amount, tx.category, score, ctx.goals,
+        recent_mood=ctx.recent_mood, user_name=uname, contacts=ctx.contacts
     )
 
     # Multi-step reflective questions (contextual)
     questions = get_reflective_questions(
         score, tx.category, tx.amount,
-        mood_data=moods, goals=goals, history=all_history,
+        mood_data=ctx.moods, goals=ctx.goals, history=ctx.all_history,
         timestamp_str=ts
     )
 
     # User context for interconnection
-    user_context = get_user_context(uid, all_history, moods, goals, recent_mood)
+    user_context = get_user_context(uid, ctx.all_history, ctx.moods, ctx.goals, ctx.recent_mood)
 
     # Lock duration from user settings
     lock_duration = settings.get("lock_duration", 20)
 
     # Accountability alert
     accountability_alert = None
-    if contacts and score >= threshold and settings.get("enable_accountability", 1):
-        c = contacts[0]
+    if ctx.contacts and score >= threshold and settings.get("enable_accountability", 1):
+        c = ctx.contacts[0]
         accountability_alert = (
             f"📱 {c['name']} would be notified: "
             f"\"{uname} is about to spend ₹{tx.amount:,.0f} on "
@@ -111,25 +140,22 @@ async def analyze_transaction(tx: TransactionCreate, request: Request):
             "category": tx.category,
             "timestamp": ts,
         },
+        "analysis_token": analysis_token.issue(
+            uid, _token_inputs(tx, ts), score, risk, ctx.data_version),
     }
 
 
 @router.post("/commit")
-async def commit_transaction(tx: TransactionCreate, request: Request):
+async def commit_transaction(tx: TransactionDecision, request: Request):
     """Actually save the transaction (user chose to proceed)."""
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
 
     ts = tx.timestamp or datetime.now(timezone.utc).isoformat()
-    history = db.get_committed_transactions(uid, limit=200)
-    moods = db.get_all_moods(uid, limit=20)
+    score, risk = await _score(uid, tx, ts)
 
-    score, risk, _ = calculate_impulse_score(
-        tx.amount, tx.category, ts, history, moods
-    )
-
-    tx_id = db.insert_transaction(uid, {
+    tx_id = await db.run(db.insert_transaction, uid, {
         "amount": tx.amount,
         "merchant": tx.merchant,
         "category": tx.category,
@@ -141,29 +167,23 @@ async def commit_transaction(tx: TransactionCreate, request: Request):
         "was_cancelled": 0,
     })
 
-    # Retrain ML model if enough data
-    all_tx = db.get_all_transactions(uid)
-    train_model(uid, all_tx)
+    # Retrain ML model in the background (debounced per user)
+    schedule_training(uid, functools.partial(db.get_user_history, uid))
 
     return {"status": "committed", "transaction_id": tx_id, "impulse_score": score}
 
 
 @router.post("/cancel")
-async def cancel_transaction(tx: TransactionCreate, request: Request):
+async def cancel_transaction(tx: TransactionDecision, request: Request):
     """Record a cancelled transaction (user chose NOT to buy)."""
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
 
     ts = tx.timestamp or datetime.now(timezone.utc).isoformat()
-    history = db.get_committed_transactions(uid, limit=200)
-    moods = db.get_all_moods(uid, limit=20)
-
-    score, risk, _ = calculate_impulse_score(
-        tx.amount, tx.category, ts, history, moods
-    )
+    score, risk = await _score(uid, tx, ts)
 
-    tx_id = db.insert_transaction(uid, {
+    tx_id = await db.run(db.insert_transaction, uid, {
         "amount": tx.amount,
         "merchant": tx.merchant,
         "category": tx.category,
@@ -176,9 +196,9 @@ async def cancel_transaction(tx: TransactionCreate, request: Request):
     })
 
     # Credit savings goal if available
-    goals = db.get_savings_goals(uid)
+    goals = await db.run(db.get_savings_goals, uid)
     if goals:
-        db.update_savings_goal_amount(goals[0]["id"], tx.amount)
+        await db.run(db.update_savings_goal_amount, uid, goals[0]["id"], tx.amount)
 
     return {
         "status": "cancelled",
@@ -189,13 +209,44 @@ async def cancel_transaction(tx: TransactionCreate, request: Request):
     }
 
 
+@router.post("/batch")
+async def import_transactions(batch: TransactionBatch, request: Request):
+    """Bulk-import transactions (backfills, imports) in a single write transaction."""
+    uid, _ = _get_user(request)
+    if not uid:
+        return {"error": "Not logged in"}
+
+    now = datetime.now(timezone.utc).isoformat()
+    history = await db.run(db.get_user_history, uid, limit=200, committed_only=True)
+    moods = await db.run(db.get_all_moods, uid, limit=20)
+
+    rows = [{
+        "amount": tx.amount,
+        "merchant": tx.merchant,
+        "category": tx.category,
+        "timestamp": tx.timestamp or now,
+        "was_paused": int(tx.was_cancelled),
+        "was_overridden": 0,
+        "was_cancelled": int(tx.was_cancelled),
+        "notes": tx.notes,
+    } for tx in batch.transactions]
+    scores, risks, _ = calculate_impulse_scores_batch(rows, history, moods)
+    for row, score, risk in zip(rows, scores, risks):
+        row["impulse_score"] = float(score)
+        row["risk_level"] = risk
+    tx_ids = await db.run(db.insert_transactions_many, uid, rows)
+    if tx_ids:
+        schedule_training(uid, functools.partial(db.get_user_history, uid), new_rows=len(tx_ids))
+    return {"status": "imported", "count": len(tx_ids), "transaction_ids": tx_ids}
+
+
 @router.post("/outcome")
 async def record_outcome(outcome: TransactionOutcome, request: Request):
     """Update a transaction with its final outcome."""
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    db.update_transaction_outcome(
+    await db.run(db.update_transaction_outcome, uid,
         outcome.transaction_id, outcome.was_paused,
         outcome.was_overridden, outcome.was_cancelled, outcome.pause_duration
     )
@@ -208,7 +259,7 @@ async def get_recent(request: Request):
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    txs = db.get_all_transactions(uid, limit=20)
+    txs = await db.run(db.get_all_transactions, uid, limit=20)
     return {"transactions": txs}
 
 
@@ -218,7 +269,7 @@ async def get_settings(request: Request):
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    settings = db.get_user_settings(uid)
+    settings = await db.run(db.get_user_settings, uid)
     return settings
 
 
@@ -228,7 +279,7 @@ async def save_settings(settings: UserSettingsUpdate, request: Request):
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    db.update_user_settings(uid, settings.dict())
+    await db.run(db.update_user_settings, uid, settings.dict())
     return {"status": "saved"}
 
 
@@ -252,9 +303,11 @@ async def get_context(request: Request):
     uid, _ = _get_user(request)
     if not uid:
         return {"error": "Not logged in"}
-    history = db.get_all_transactions(uid, limit=200)
-    moods = db.get_all_moods(uid, limit=20)
-    goals = db.get_savings_goals(uid)
-    recent_mood = db.get_recent_mood(uid)
-    context = get_user_context(uid, history, moods, goals, recent_mood)
-    return context
+    # The control streak counts back from today
+    return await cached_json(request, uid, "transactions/context", lambda: _context(uid),
+                             vary=datetime.now().date().isoformat())
+
+
+async def _context(uid: str) -> dict:
+    ctx = await db.run(db.load_user_context, uid)
+    return get_user_context(uid, ctx.all_history, ctx.moods, ctx.goals, ctx.recent_mood)
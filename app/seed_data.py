@@ -6,6 +6,7 @@ import random
 from datetime import datetime, timedelta, timezone
 from app import database as db
 from app.ml.impulse_engine import calculate_impulse_score, CATEGORY_RISK
+from app.timefields import time_fields
 
 MERCHANTS = {
     "food_delivery": ["Swiggy", "Zomato", "Uber Eats", "Domino's"],
@@ -48,15 +49,14 @@ def seed_user_data(user_id: str, days: int = 30, tx_per_day: tuple = (2, 6)):
                     MOOD_LIST, weights=[1, 2, 3, 2, 3, 4, 3, 1], k=1
                 )[0]
             intensity = random.randint(3, 9)
-            db.insert_mood(user_id, {
-                "mood": mood, "emoji": emoji,
-                "intensity": intensity, "timestamp": ts.isoformat(),
-            })
             moods_generated.append({"mood": mood, "emoji": emoji,
                                      "intensity": intensity, "timestamp": ts.isoformat()})
+    db.insert_moods_many(user_id, moods_generated)
 
-    # Generate transactions
-    tx_count = 0
+    # Generate transactions — scored against the ones generated before them
+    # (newest first, like get_committed_transactions) and written in one batch
+    tx_rows = []
+    committed = []
     for d in range(days):
         day = now - timedelta(days=days - d)
         n = random.randint(*tx_per_day)
@@ -94,7 +94,7 @@ def seed_user_data(user_id: str, days: int = 30, tx_per_day: tuple = (2, 6)):
             past_moods = [m for m in moods_generated
                           if m["timestamp"] <= ts.isoformat()][-5:]
 
-            history = db.get_committed_transactions(user_id, limit=100)
+            history = sorted(committed, key=lambda t: t["timestamp"], reverse=True)[:100]
             score, risk, _ = calculate_impulse_score(
                 amount, category, ts.isoformat(), history, past_moods
             )
@@ -104,15 +104,20 @@ def seed_user_data(user_id: str, days: int = 30, tx_per_day: tuple = (2, 6)):
             if score >= 55 and random.random() < 0.3:
                 was_cancelled = 1
 
-            db.insert_transaction(user_id, {
+            row = {
                 "amount": amount, "merchant": merchant,
                 "category": category, "timestamp": ts.isoformat(),
                 "impulse_score": score, "risk_level": risk,
                 "was_paused": 1 if score >= 48 else 0,
                 "was_overridden": 1 if score >= 48 and not was_cancelled else 0,
                 "was_cancelled": was_cancelled,
-            })
-            tx_count += 1
+            }
+            tx_rows.append(row)
+            if not was_cancelled:
+                epoch_us, h, wd, day_num = time_fields(ts)
+                committed.append({**row, "epoch_us": epoch_us, "hour": h,
+                                  "weekday": wd, "day_num": day_num})
+    tx_count = len(db.insert_transactions_many(user_id, tx_rows))
 
     # Add a savings goal
     db.insert_savings_goal(user_id, {
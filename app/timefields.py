@@ -0,0 +1,47 @@
+"""
+Numeric time fields stored next to every ISO timestamp.
+
+Transactions and moods carry epoch_us plus the wall-clock hour, weekday and
+day number of the timestamp as written, so analytics compare integers
+instead of re-parsing ISO strings row by row.
+"""
+from datetime import date, datetime, timezone
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+HOUR_US = 3600 * 1_000_000
+
+
+def time_fields(timestamp) -> tuple[int, int, int, int]:
+    """(epoch_us, hour, weekday, day_num) for an ISO string or datetime.
+
+    Naive timestamps are treated as UTC for epoch_us; hour, weekday and
+    day_num always describe the wall clock the timestamp was written in.
+    """
+    ts = datetime.fromisoformat(timestamp) if isinstance(timestamp, str) else timestamp
+    aware = ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    d = aware - _EPOCH
+    epoch_us = (d.days * 86400 + d.seconds) * 1_000_000 + d.microseconds
+    return epoch_us, ts.hour, ts.weekday(), day_number(ts)
+
+
+def day_number(d) -> int:
+    """Days since 1970-01-01 for a date (or the wall-clock date of a datetime)."""
+    return d.toordinal() - _EPOCH_ORDINAL
+
+
+def time_columns(timestamp) -> tuple:
+    """time_fields() for storage — all None if the timestamp does not parse."""
+    try:
+        return time_fields(timestamp)
+    except (TypeError, ValueError):
+        return None, None, None, None
+
+
+def row_time(row: dict) -> tuple[int, int, int, int]:
+    """Stored time fields of a row, parsing its timestamp only as a fallback."""
+    epoch_us = row.get("epoch_us")
+    if epoch_us is not None:
+        return epoch_us, row["hour"], row["weekday"], row["day_num"]
+    return time_fields(row["timestamp"])
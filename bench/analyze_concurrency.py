@@ -0,0 +1,130 @@
+"""
+/analyze latency under parallel dashboard load.
+
+    python bench/analyze_concurrency.py [--users 8] [--days 365] [--workers 4] [--requests 50]
+                                        [--max-ratio 5] [--max-lag-ms 500]
+
+Runs the app in-process (httpx ASGITransport, one event loop) against a
+throwaway database: first /analyze alone, then the same /analyze loop while
+--workers tasks hammer /api/dashboard/stats and /api/mood/correlation for
+other users. The response and mood caches are disabled so every dashboard
+call does its full work. Alongside latency it reports event-loop lag (how
+late a 5 ms sleep wakes up): a blocking call on the loop shows up there,
+while GIL contention with the DB executor threads only shows in latency.
+
+Exits non-zero when the loaded /analyze p99 exceeds --max-ratio times the
+idle p99, or loop lag p99 under load exceeds --max-lag-ms. The dashboard
+threads compete for the GIL, so about 3-4x is expected with the defaults.
+The clients share the loop, so a handler blocking it delays requests
+before their timer starts: that shows up as loop lag (hundreds of ms per
+blocked call), not in the latency ratio.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ["VIBESHIELD_RESPONSE_CACHE_MB"] = "0"
+os.environ["VIBESHIELD_MOOD_CACHE_SIZE"] = "0"
+os.environ.setdefault("VIBESHIELD_MODEL_DIR", tempfile.mkdtemp(prefix="vibeshield-bench-models-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from app import database as db  # noqa: E402
+from app.seed_data import seed_user_data  # noqa: E402
+
+ANALYZE = {"amount": 4999, "merchant": "Store", "category": "electronics", "item": "headphones"}
+
+
+def percentile(samples: list[float], p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))] * 1e3
+
+
+async def run(app, users: list[str], workers: int, requests: int, load: bool) -> tuple[list, list]:
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+
+    async def ticker():
+        while not stop.is_set():
+            t = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - t - 0.005)
+
+    async def analyze(uid):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     cookies={"vibeshield_user": uid}) as c:
+            for _ in range(requests):
+                t = time.perf_counter()
+                r = await c.post("/api/transactions/analyze", json=ANALYZE)
+                latencies.append(time.perf_counter() - t)
+                r.raise_for_status()
+
+    async def dashboard(i):
+        n = 0
+        while not stop.is_set():
+            uid = users[(i + n) % len(users)]
+            n += 1
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                         cookies={"vibeshield_user": uid}) as c:
+                (await c.get("/api/dashboard/stats")).raise_for_status()
+                (await c.get("/api/mood/correlation")).raise_for_status()
+
+    background = [asyncio.create_task(ticker())]
+    if load:
+        background += [asyncio.create_task(dashboard(i)) for i in range(workers)]
+    await asyncio.gather(*(analyze(users[i % len(users)]) for i in range(workers)))
+    stop.set()
+    await asyncio.gather(*background)
+    return latencies, lags
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--users", type=int, default=8)
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--requests", type=int, default=50)
+    ap.add_argument("--max-ratio", type=float, default=5.0,
+                    help="fail if /analyze p99 under load / idle p99 exceeds this")
+    ap.add_argument("--max-lag-ms", type=float, default=500.0,
+                    help="fail if event-loop lag p99 under load exceeds this")
+    args = ap.parse_args()
+
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="vibeshield-bench-"), "vibeshield.db")
+    db.init_db()
+    users = [f"bench{i}" for i in range(args.users)]
+    t = time.perf_counter()
+    for uid in users:
+        seed_user_data(uid, days=args.days)
+    print(f"seeded {args.users} users x {args.days} days "
+          f"({sum(db.get_transaction_count(u) for u in users)} transactions) in {time.perf_counter() - t:.1f}s")
+
+    from app.main import app
+    p99 = {}
+    for label, load in (("idle", False), ("under load", True)):
+        lat, lags = asyncio.run(run(app, users, args.workers, args.requests, load))
+        p99[load] = percentile(lat, .99)
+        lag_p99 = percentile(lags, .99)
+        print(f"/analyze {label:>10}: n={len(lat)} p50 {percentile(lat, .5):6.1f}ms  "
+              f"p99 {p99[load]:6.1f}ms  max {max(lat) * 1e3:6.1f}ms  |  "
+              f"loop lag p99 {lag_p99:5.1f}ms  max {max(lags) * 1e3:5.1f}ms")
+    db.close_db()
+    ratio = p99[True] / p99[False]
+    print(f"p99 under load / idle: {ratio:.2f}x (bound {args.max_ratio:g}x), "
+          f"loop lag p99 under load: {lag_p99:.1f}ms (bound {args.max_lag_ms:g}ms)")
+    failures = []
+    if ratio > args.max_ratio:
+        failures.append(f"/analyze p99 degrades {ratio:.2f}x under load, more than {args.max_ratio:g}x")
+    if lag_p99 > args.max_lag_ms:
+        failures.append(f"event loop blocked: lag p99 {lag_p99:.1f}ms > {args.max_lag_ms:g}ms")
+    if failures:
+        sys.exit("FAIL: " + "; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
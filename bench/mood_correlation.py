@@ -0,0 +1,95 @@
+"""
+Mood correlation scaling over years of history.
+
+    python bench/mood_correlation.py [--years 1 2 5 10] [--tx-per-day 8] [--moods-per-day 2]
+
+Times analyze_moods() on synthetic histories (list input and the streamed,
+newest-first input the routers use) and, up to --naive-max-years, the
+original O(moods × transactions) scan it replaced, checking both agree.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ml.mood_correlator import MOOD_WINDOW_HOURS, analyze_moods  # noqa: E402
+from app.timefields import HOUR_US, row_time, time_columns  # noqa: E402
+
+MOODS = ["happy", "neutral", "sad", "angry", "tired", "bored", "anxious", "excited"]
+CATEGORIES = ["food", "shopping", "entertainment", "gaming", "fashion", "electronics"]
+
+
+def history(years: float, tx_per_day: float, moods_per_day: float, seed: int = 7):
+    """Newest-first transactions and moods spread uniformly over ``years``."""
+    rng = random.Random(seed)
+    end = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    span_s = int(years * 365 * 86400)
+
+    def rows(n, make):
+        out = []
+        for i, offset in enumerate(sorted(rng.randrange(span_s) for _ in range(n))):
+            ts = (end - timedelta(seconds=offset)).isoformat()
+            epoch_us, hour, weekday, day_num = time_columns(ts)
+            out.append({"id": n - i, "timestamp": ts, "epoch_us": epoch_us, "hour": hour,
+                        "weekday": weekday, "day_num": day_num, **make()})
+        return out
+
+    txs = rows(int(years * 365 * tx_per_day),
+               lambda: {"amount": round(rng.uniform(50, 5000), 2), "category": rng.choice(CATEGORIES)})
+    moods = rows(int(years * 365 * moods_per_day),
+                 lambda: {"mood": rng.choice(MOODS), "intensity": rng.randint(1, 10)})
+    return txs, moods
+
+
+def naive_mood_spend(txs, moods, window_hours: float = MOOD_WINDOW_HOURS) -> dict:
+    """The pre-index algorithm: every mood scans every transaction."""
+    half = int(window_hours * HOUR_US)
+    tx_by_ts = [(row_time(t)[0], t["amount"]) for t in txs]
+    totals: dict[str, list[float]] = {}
+    for m in moods:
+        m_us = row_time(m)[0]
+        spend = sum(amt for ts, amt in tx_by_ts if m_us - half <= ts <= m_us + half)
+        totals.setdefault(m["mood"], []).append(spend)
+    return {k: round(sum(v) / len(v), 0) for k, v in totals.items()}
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--years", type=float, nargs="+", default=[1, 2, 5, 10])
+    ap.add_argument("--tx-per-day", type=float, default=8)
+    ap.add_argument("--moods-per-day", type=float, default=2)
+    ap.add_argument("--naive-max-years", type=float, default=1)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'years':>6} {'tx':>8} {'moods':>7} {'list ms':>9} {'stream ms':>10} {'naive ms':>10}")
+    for years in args.years:
+        txs, moods = history(years, args.tx_per_day, args.moods_per_day)
+        listed = best_of(lambda: analyze_moods(txs, moods), args.repeat)
+        streamed = best_of(lambda: analyze_moods(iter(txs), moods, newest_first=True), args.repeat)
+        naive = "-"
+        if years <= args.naive_max_years:
+            t = time.perf_counter()
+            expected = naive_mood_spend(txs, moods)
+            naive = f"{(time.perf_counter() - t) * 1e3:10.0f}"
+            assert analyze_moods(txs, moods)["mood_spend"] == expected, "index disagrees with naive scan"
+        assert analyze_moods(iter(txs), moods, newest_first=True) == analyze_moods(txs, moods), \
+            "stream disagrees with index"
+        print(f"{years:>6g} {len(txs):>8} {len(moods):>7} {listed:>9.1f} {streamed:>10.1f} {naive:>10}")
+
+
+if __name__ == "__main__":
+    main()
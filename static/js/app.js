@@ -629,7 +629,8 @@ async function commitTransaction() {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 amount: td.amount, merchant: td.merchant,
-                category: td.category, timestamp: td.timestamp
+                category: td.category, timestamp: td.timestamp,
+                analysis_token: currentAnalysis.analysis_token
             })
         });
         const data = await res.json();
@@ -654,7 +655,8 @@ async function cancelTransaction() {
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 amount: td.amount, merchant: td.merchant,
-                category: td.category, timestamp: td.timestamp
+                category: td.category, timestamp: td.timestamp,
+                analysis_token: currentAnalysis.analysis_token
             })
         });
         const data = await res.json();
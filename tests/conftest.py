@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+# Before any app import: models go to a throwaway directory, never ./models
+os.environ.setdefault("VIBESHIELD_MODEL_DIR", tempfile.mkdtemp(prefix="vibeshield-models-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app import database as db
+from app import response_cache
+from app.ml import mood_correlator
+from app.ml.impulse_engine import shutdown_training
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """A migrated, empty database file for the duration of one test."""
+    db.close_db()
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "vibeshield.db"))
+    # In-process caches are keyed by user, not by database file
+    db._feature_states.clear()
+    mood_correlator._cache.clear()
+    response_cache.cache.clear()
+    db.init_db()
+    yield db.DB_PATH
+    # Debounced retrains would otherwise load history from whatever DB_PATH is current when they fire
+    shutdown_training()
+    db.close_db()
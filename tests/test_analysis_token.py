@@ -0,0 +1,72 @@
+"""Analysis tokens: a genuine one is reused, anything else falls back to scoring."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app import analysis_token, database as db
+from app.main import app
+
+TX = {"amount": 2500.0, "merchant": "Store", "category": "electronics",
+      "timestamp": "2026-03-01T23:15:00+00:00"}
+
+
+def test_roundtrip():
+    inputs = [TX["amount"], TX["merchant"], TX["category"], TX["timestamp"]]
+    token = analysis_token.issue("u", inputs, 61.5, "medium", 4)
+    claims = analysis_token.verify(token, "u", inputs)
+    assert (claims["s"], claims["r"], claims["v"]) == (61.5, "medium", 4)
+    assert analysis_token.verify(token, "other", inputs) is None
+    assert analysis_token.verify(token, "u", inputs[:3] + ["2026-03-02T00:00:00+00:00"]) is None
+
+
+@pytest.mark.parametrize("token", [
+    "é.é", "", ".", "no-dot", "a.b", "💥.💥",
+    analysis_token._b64(b"[1, 2]") + "." + analysis_token._sign(analysis_token._b64(b"[1, 2]")),
+    analysis_token._b64(b"\xff\xfe") + "." + analysis_token._sign(analysis_token._b64(b"\xff\xfe")),
+])
+def test_bad_tokens_are_ignored(token):
+    assert analysis_token.verify(token, "u", []) is None
+
+
+@pytest.mark.parametrize("endpoint", ["commit", "cancel"])
+def test_bad_token_recomputes_instead_of_failing(fresh_db, endpoint):
+    client = TestClient(app)
+    client.cookies.set("vibeshield_user", "tok")
+    analyzed = client.post("/api/transactions/analyze", json=TX).json()
+
+    r = client.post(f"/api/transactions/{endpoint}", json={**TX, "analysis_token": "é.é"})
+
+    assert r.status_code == 200
+    assert r.json()["impulse_score"] == analyzed["impulse_score"]
+
+
+def _analyzed(uid: str) -> tuple[TestClient, dict]:
+    client = TestClient(app)
+    client.cookies.set("vibeshield_user", uid)
+    return client, client.post("/api/transactions/analyze", json=TX).json()
+
+
+def test_valid_token_skips_recompute(fresh_db, monkeypatch):
+    client, analyzed = _analyzed("reuse")
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("a valid token must not reload scoring inputs")
+    monkeypatch.setattr(db, "get_feature_state", unexpected)
+    monkeypatch.setattr(db, "get_all_moods", unexpected)
+    r = client.post("/api/transactions/commit", json={**TX, "analysis_token": analyzed["analysis_token"]})
+
+    assert r.status_code == 200
+    assert r.json()["impulse_score"] == analyzed["impulse_score"]
+
+
+def test_write_after_analyze_forces_recompute(fresh_db, monkeypatch):
+    client, analyzed = _analyzed("stale")
+    before = db.get_data_version("stale")
+    db.insert_mood("stale", {"mood": "stressed", "emoji": "x", "intensity": 9, "timestamp": TX["timestamp"]})
+    assert db.get_data_version("stale") > before
+
+    loads = []
+    get_feature_state = db.get_feature_state
+    monkeypatch.setattr(db, "get_feature_state", lambda uid: (loads.append(uid), get_feature_state(uid))[1])
+    r = client.post("/api/transactions/commit", json={**TX, "analysis_token": analyzed["analysis_token"]})
+
+    assert r.status_code == 200 and loads == ["stale"]
@@ -0,0 +1,77 @@
+"""calculate_impulse_scores_batch must agree exactly with the scalar scorer."""
+import builtins
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.ml.impulse_engine import (
+    CATEGORY_RISK, FACTOR_WEIGHTS, calculate_impulse_score, calculate_impulse_scores_batch,
+)
+
+MOODS = ["happy", "neutral", "sad", "angry", "tired", "bored", "anxious", "excited"]
+NOW = datetime(2026, 3, 14, 21, 30, tzinfo=timezone.utc)
+
+
+def _history(rng, n):
+    rows = []
+    for i in range(n):
+        ts = NOW - timedelta(minutes=rng.randrange(60 * 24 * 30))
+        rows.append({"id": i + 1, "amount": round(rng.uniform(20, 8000), 2),
+                     "category": rng.choice(list(CATEGORY_RISK)), "timestamp": ts.isoformat(),
+                     "impulse_score": rng.uniform(0, 100), "was_cancelled": 0})
+    rows.sort(key=lambda t: t["timestamp"], reverse=True)
+    return rows
+
+
+def _candidates(rng, n):
+    return [{"amount": rng.choice([50, 199.99, 200, 500, 1500, 3000, round(rng.uniform(1, 10000), 2)]),
+             "category": rng.choice(list(CATEGORY_RISK) + ["unknown"]),
+             "timestamp": (NOW + timedelta(minutes=rng.randrange(-600, 600))).isoformat()}
+            for _ in range(n)]
+
+
+def _scalar(candidates, history, moods):
+    scored = [calculate_impulse_score(t["amount"], t["category"], t["timestamp"], history, moods)
+              for t in candidates]
+    return ([s for s, _, _ in scored], [r for _, r, _ in scored],
+            [[f[k]["score"] for k, _ in FACTOR_WEIGHTS] for _, _, f in scored])
+
+
+@pytest.mark.parametrize("history_size", [0, 1, 40, 400])
+def test_batch_matches_scalar(history_size):
+    rng = random.Random(history_size)
+    history = _history(rng, history_size)
+    moods = [{"mood": rng.choice(MOODS), "intensity": rng.randint(1, 10),
+              "timestamp": NOW.isoformat()}]
+    candidates = _candidates(rng, 3000 if history_size == 40 else 300)
+
+    scores, risks, factors = calculate_impulse_scores_batch(candidates, history, moods, with_factors=True)
+
+    assert (scores, risks, factors) == _scalar(candidates, history, moods)
+
+
+def test_batch_returns_lists_with_and_without_numpy(monkeypatch):
+    rng = random.Random(3)
+    history, candidates = _history(rng, 50), _candidates(rng, 50)
+    vectorised = calculate_impulse_scores_batch(candidates, history, [], with_factors=True)
+
+    real_import = builtins.__import__
+
+    def no_numpy(name, *args, **kwargs):
+        if name == "numpy":
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "__import__", no_numpy)
+    fallback = calculate_impulse_scores_batch(candidates, history, [], with_factors=True)
+
+    assert vectorised == fallback
+    for result in (vectorised, fallback):
+        scores, risks, factors = result
+        # Plain Python numbers (as from the scalar scorer), no numpy scalars
+        assert type(scores) is list and all(type(s) in (int, float) for s in scores)
+        assert type(risks) is list and all(type(r) is str for r in risks)
+        assert type(factors) is list
+        assert all(type(row) is list and all(type(x) in (int, float) for x in row) for row in factors)
+    assert calculate_impulse_scores_batch(candidates, history, [])[2] is None
@@ -0,0 +1,40 @@
+"""Importing app.main stays cheap: no heavy modules, no database I/O."""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = {"numpy", "sklearn", "jinja2"}
+
+_PROBE = """
+import json, sqlite3
+opened = []
+_connect = sqlite3.connect
+sqlite3.connect = lambda *a, **k: (opened.append(str(a[0]) if a else ""), _connect(*a, **k))[1]
+import app.main
+print(json.dumps({"opened": opened}))
+"""
+
+
+def _imported(importtime_log: str) -> set[str]:
+    # "import time: self [us] | cumulative | imported package", nested names indented
+    return {line.rsplit("|", 1)[1].strip() for line in importtime_log.splitlines()
+            if line.startswith("import time:") and not line.endswith("imported package")}
+
+
+@pytest.mark.parametrize("env", [{}, {"VERCEL": "1"}, {"VIBESHIELD_FAST_START": "1"}],
+                         ids=["default", "vercel", "fast-start"])
+def test_import_is_lazy(env, tmp_path):
+    run_env = {k: v for k, v in os.environ.items() if k not in ("VERCEL", "VIBESHIELD_FAST_START")}
+    run_env.update(env, VIBESHIELD_MODEL_DIR=str(tmp_path / "models"), PYTHONPATH=ROOT)
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE], cwd=ROOT, env=run_env,
+                         capture_output=True, text=True, timeout=120, check=True)
+    imported = _imported(out.stderr)
+
+    assert "app.main" in imported
+    assert sorted(HEAVY & {name.split(".")[0] for name in imported}) == []
+    assert json.loads(out.stdout.strip().splitlines()[-1])["opened"] == []
@@ -0,0 +1,67 @@
+"""Cached FeatureState: never mutated once published, always equal to a rebuild."""
+from datetime import datetime, timedelta, timezone
+
+from app import database as db
+from app.ml.feature_state import FeatureState
+
+START = datetime(2026, 2, 1, 12, tzinfo=timezone.utc)
+
+
+def _tx(i: int, amount: float = 100.0) -> dict:
+    return {"amount": amount + i, "merchant": "m", "category": "food" if i % 2 else "gaming",
+            "timestamp": (START + timedelta(minutes=20 * i)).isoformat(), "impulse_score": 30.0,
+            "risk_level": "low", "was_paused": 0, "was_overridden": 0, "was_cancelled": 0, "notes": ""}
+
+
+def _features(state: FeatureState, ts_us: int) -> tuple:
+    return state.amount_stats(), state.recent_count(ts_us), state.same_day_count("food", 0), len(state)
+
+
+def test_copy_is_independent():
+    state = FeatureState.from_history([{**_tx(i), "id": i + 1} for i in range(5)], window=4)
+    clone = state.copy()
+    clone.add({**_tx(9), "id": 10})
+    assert len(state) == len(clone) == 4
+    assert state.amount_stats() != clone.amount_stats()
+    assert 10 not in state._ids and state._entries[-1][1] == 5
+
+
+def test_commit_replaces_cached_state_instead_of_mutating_it(fresh_db):
+    uid = "fs"
+    for i in range(3):
+        db.insert_transaction(uid, _tx(i))
+    held = db.get_feature_state(uid)
+    snapshot = (list(held._entries), held._n, held._mean, held._m2, dict(held._same_day))
+
+    db.insert_transaction(uid, _tx(3, amount=5000))
+
+    # A scorer still holding the old object sees it unchanged
+    assert (held._entries, held._n, held._mean, held._m2, held._same_day) == snapshot
+    current = db.get_feature_state(uid)
+    assert current is not held and len(current) == 4
+    rebuilt = FeatureState.from_history(db.get_committed_transactions(uid))
+    now_us = int((START + timedelta(hours=1)).timestamp() * 1_000_000)
+    assert _features(current, now_us) == _features(rebuilt, now_us)
+
+
+def test_write_from_another_connection_is_picked_up(fresh_db):
+    uid = "fs-other"
+    for i in range(3):
+        db.insert_transaction(uid, _tx(i))
+    stale = db.get_feature_state(uid)
+    assert db.load_user_context(uid).features is stale
+
+    # Another process writing the same file never touches this process's cache
+    conn = db._connect(db.DB_PATH)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        db._insert_transaction(conn, uid, db._transaction_row(_tx(3, amount=5000)))
+        conn.commit()
+    finally:
+        conn.close()
+
+    now_us = int((START + timedelta(hours=1)).timestamp() * 1_000_000)
+    expected = _features(FeatureState.from_history(db.get_committed_transactions(uid)), now_us)
+    from_context = db.load_user_context(uid).features
+    assert from_context is not stale and _features(from_context, now_us) == expected
+    assert _features(db.get_feature_state(uid), now_us) == expected
@@ -0,0 +1,74 @@
+"""KeywordMatcher: keywords added while other threads detect are seen at once."""
+import sys
+import threading
+
+from app.ml.impulse_engine import ITEM_TO_CATEGORY
+from app.ml.keyword_matcher import KeywordMatcher
+
+
+def test_add_while_detecting():
+    # Switch threads as often as possible so lookups interleave with add()
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    matcher = KeywordMatcher(ITEM_TO_CATEGORY, cache_size=64)
+    new = [f"qx{i:03d}vz" for i in range(300)]
+    adding = [0]
+    stop = threading.Event()
+    errors = []
+
+    def detect():
+        while not stop.is_set():
+            try:
+                # Keep the keyword being added hot in the cache as "no match"
+                kw = new[adding[0]]
+                matcher.detect(kw)
+                matcher.detect(f"a {kw} b")
+                assert matcher.detect("pizza") == ITEM_TO_CATEGORY["pizza"]
+            except Exception as e:   # surfaced in the main thread
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=detect) for _ in range(4)]
+    for t in threads:
+        t.start()
+    try:
+        for i, kw in enumerate(new):
+            adding[0] = i
+            matcher.add(kw, f"cat{i}")
+            assert matcher.detect(kw) == f"cat{i}"
+            assert matcher.detect(f"a {kw} b") == f"cat{i}"
+        matcher.add(new[0], "remapped")
+        assert matcher.detect(new[0]) == "remapped"
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        sys.setswitchinterval(interval)
+
+    assert errors == []
+    assert len(matcher) == len(ITEM_TO_CATEGORY) + len(new)
+
+
+def test_lookup_racing_add_cannot_cache_a_stale_answer():
+    matcher = KeywordMatcher({"pizza": "food"})
+    entered, release = threading.Event(), threading.Event()
+    automaton = matcher._automaton
+    find_all = automaton.find_all
+
+    def slow_find_all(text):
+        hits = find_all(text)
+        entered.set()
+        release.wait(5)
+        return hits
+
+    automaton.find_all = slow_find_all
+    result = []
+    t = threading.Thread(target=lambda: result.append(matcher.detect("cheap qxvz deal")))
+    t.start()
+    assert entered.wait(5)
+    matcher.add("qxvz", "gadgets")    # published while the lookup above is mid-flight
+    release.set()
+    t.join()
+
+    assert result == [None]
+    assert matcher.detect("cheap qxvz deal") == "gadgets"
@@ -0,0 +1,92 @@
+"""A user's stored model goes away with their data."""
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("sklearn")
+
+from app.ml import impulse_engine  # noqa: E402
+from app.ml.impulse_engine import TrainingScheduler, forget_user_model, train_model  # noqa: E402
+from app.ml.model_registry import ModelRegistry  # noqa: E402
+
+
+def _history(n: int = 40) -> list[dict]:
+    rng = random.Random(5)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [{"id": i + 1, "amount": rng.uniform(50, 5000), "category": rng.choice(["food", "gaming"]),
+             "timestamp": (start + timedelta(hours=7 * i)).isoformat(),
+             "impulse_score": 80.0 if i % 3 == 0 else 20.0, "was_cancelled": 0} for i in range(n)]
+
+
+def test_forget_user_model_deletes_file_and_cache():
+    uid = "forget-me"
+    train_model(uid, _history())
+    registry = impulse_engine._registry
+    assert registry.get(uid) is not None and os.path.exists(registry._path(uid))
+
+    forget_user_model(uid)
+
+    assert registry.get(uid) is None
+    assert not os.path.exists(registry._path(uid))
+    assert impulse_engine.ml_impulse_probability(uid, 500, "food", "2026-01-05T23:00:00") is None
+
+
+def test_cancel_discards_a_run_in_progress():
+    uid = "cancel-me"
+    scheduler = TrainingScheduler(every_rows=1, debounce_s=60, workers=1)
+    started, release = threading.Event(), threading.Event()
+
+    def loader():
+        started.set()
+        release.wait(5)
+        return _history()
+
+    try:
+        scheduler.schedule(uid, loader)
+        assert started.wait(5)
+        scheduler.schedule(uid, loader)        # queued follow-up
+        scheduler.cancel(uid)
+        release.set()
+    finally:
+        scheduler.shutdown(wait=True)
+
+    assert scheduler.stats()["pending_users"] == 0
+    assert impulse_engine._registry.get(uid) is None
+
+
+def test_debounced_users_share_one_timer_thread():
+    scheduler = TrainingScheduler(every_rows=100, debounce_s=0.05, workers=2)
+    loaded = []
+    threads = threading.active_count()
+    try:
+        for i in range(200):
+            scheduler.schedule(f"debounce-{i}", lambda i=i: loaded.append(i) or [])
+        assert threading.active_count() <= threads + 1
+        scheduler.schedule("debounce-0", lambda: loaded.append(0) or [], new_rows=99)   # due now
+        deadline = time.monotonic() + 5
+        while scheduler.stats()["completed"] < 200 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        scheduler.shutdown(wait=True)
+
+    assert sorted(loaded) == list(range(200))
+    assert scheduler.stats()["pending_users"] == 0
+
+
+def test_missing_model_is_cached_until_put(tmp_path, monkeypatch):
+    registry = ModelRegistry(directory=str(tmp_path))
+    loads = []
+    load = registry._load
+    monkeypatch.setattr(registry, "_load", lambda uid: (loads.append(uid), load(uid))[1])
+
+    assert registry.get("nobody") is None and registry.get("nobody") is None
+    assert loads == ["nobody"] and registry.stats()["missing_hits"] == 1
+
+    registry.put("nobody", {"model": 1}, (1, 1))
+    assert registry.get("nobody") == {"model": 1}
+    registry.delete("nobody")
+    assert registry.get("nobody") is None and loads == ["nobody", "nobody"]
@@ -0,0 +1,82 @@
+"""Streamed mood correlation must equal the list-based one, whatever the UTC offsets."""
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database as db
+from app.main import app
+from app.ml.mood_correlator import SpendStream, analyze_moods
+
+OFFSETS = [timezone.utc, timezone(timedelta(hours=5, minutes=30)), timezone(timedelta(hours=-7)),
+           timezone(timedelta(hours=9))]
+
+
+def _tx(ts: str, amount: float, category: str = "food", cancelled: int = 0) -> dict:
+    return {"amount": amount, "merchant": "m", "category": category, "timestamp": ts,
+            "impulse_score": 50.0, "risk_level": "medium", "was_paused": 0, "was_overridden": 0,
+            "was_cancelled": cancelled, "notes": ""}
+
+
+def _mood(ts: str, mood: str) -> dict:
+    return {"mood": mood, "emoji": "x", "intensity": 5, "timestamp": ts, "notes": ""}
+
+
+def _listed(uid: str) -> dict:
+    return analyze_moods(db.get_committed_transactions(uid, limit=10 ** 6), db.get_all_moods(uid, limit=10 ** 6))
+
+
+def _streamed(uid: str) -> dict:
+    return analyze_moods(db.iter_transactions(uid, committed_only=True), db.iter_moods(uid), newest_first=True)
+
+
+def test_mixed_offsets_reported_case(fresh_db):
+    uid = "offsets"
+    db.insert_transactions_many(uid, [_tx("2026-03-01T12:00:00+05:30", 200),    # 06:30Z
+                                      _tx("2026-03-01T08:00:00+00:00", 300),    # 08:00Z
+                                      _tx("2026-03-01T10:00:00+05:30", 200)])   # 04:30Z
+    db.insert_moods_many(uid, [_mood("2026-03-01T01:00:00+00:00", "happy"),
+                               _mood("2026-03-01T14:00:00+00:00", "sad")])
+
+    # ±6 h: 01:00Z sees 04:30Z + 06:30Z, 14:00Z sees 08:00Z. Sorted as strings the
+    # rows are 12:00+05:30, 10:00+05:30, 08:00+00:00 — not newest first in time
+    expected = {"happy": 400, "sad": 300}
+    assert _streamed(uid)["mood_spend"] == _listed(uid)["mood_spend"] == expected
+
+    client = TestClient(app)
+    client.cookies.set("vibeshield_user", uid)
+    correlation = client.get("/api/mood/correlation").json()
+    assert correlation["mood_spend"] == expected
+    assert correlation["mood_count_total"] == 2
+    assert [m["mood"] for m in correlation["recent_moods"]] == ["sad", "happy"]
+    assert client.get("/api/dashboard/mood-correlation").json()["mood_spend"] == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_streamed_equals_listed_with_random_offsets(fresh_db, seed):
+    rng = random.Random(seed)
+    uid = f"rand{seed}"
+    start = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+    def stamp():
+        return (start + timedelta(minutes=rng.randrange(60 * 24 * 60))).astimezone(rng.choice(OFFSETS)).isoformat()
+
+    # Whole amounts keep every window sum exact whatever the summation order
+    db.insert_transactions_many(uid, [_tx(stamp(), rng.randint(1, 5000), rng.choice(["food", "gaming", "fashion"]),
+                                          int(rng.random() < 0.2)) for _ in range(600)]
+                                + [_tx("not a timestamp", 999)])
+    db.insert_moods_many(uid, [_mood(stamp(), rng.choice(["happy", "sad", "bored"])) for _ in range(150)])
+
+    assert _streamed(uid) == _listed(uid)
+
+
+def test_stream_rejects_out_of_order_input():
+    rows = [{"epoch_us": e, "amount": 1.0, "category": "food"} for e in (10, 30, 20)]
+    stream = SpendStream(rows)
+    with pytest.raises(ValueError):
+        stream.transactions(0, 100)
+    stream = SpendStream([])
+    stream.transactions(0, 10)
+    with pytest.raises(ValueError):
+        stream.transactions(0, 20)
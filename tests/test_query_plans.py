@@ -0,0 +1,90 @@
+"""Hot per-user reads must be index scans, never a temp B-tree sort, at 1M rows."""
+import pytest
+
+from app import database as db
+
+N_TRANSACTIONS = 1_000_000
+N_MOODS = 100_000
+N_USERS = 100
+
+_FILL_TRANSACTIONS = f"""
+    WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < {N_TRANSACTIONS - 1})
+    INSERT INTO transactions (user_id, amount, merchant, category, timestamp, impulse_score, risk_level,
+                              was_cancelled, epoch_us, hour, weekday, day_num)
+    SELECT 'u' || (i % {N_USERS}), i % 97, 'm', 'food',
+           strftime('%Y-%m-%dT%H:%M:%S', 1700000000 + i * 60, 'unixepoch'),
+           i % 100, 'low', i % 5 = 0, (1700000000 + i * 60) * 1000000, 0, 0, 0
+    FROM n"""
+
+_FILL_MOODS = f"""
+    WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i < {N_MOODS - 1})
+    INSERT INTO moods (user_id, mood, emoji, intensity, timestamp, epoch_us)
+    SELECT 'u' || (i % {N_USERS}), 'sad', 'x', 5,
+           strftime('%Y-%m-%dT%H:%M:%S', 1700000000 + i * 600, 'unixepoch'),
+           (1700000000 + i * 600) * 1000000
+    FROM n"""
+
+
+@pytest.fixture(scope="module")
+def traced_statements(tmp_path_factory):
+    """SQL run by the hot read paths against a 1M-row database."""
+    statements = []
+    connect = db._connect
+
+    def traced(path):
+        conn = connect(path)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    with pytest.MonkeyPatch.context() as mp:
+        db.close_db()
+        mp.setattr(db, "DB_PATH", str(tmp_path_factory.mktemp("plans") / "vibeshield.db"))
+        mp.setattr(db, "_connect", traced)
+        db.init_db()
+        with db.get_db_context("u0") as c:
+            c.execute("BEGIN IMMEDIATE")
+            c.execute(_FILL_TRANSACTIONS)
+            c.execute(_FILL_MOODS)
+        statements.clear()
+
+        uid = "u1"
+        db.get_all_transactions(uid)
+        db.get_committed_transactions(uid)
+        db.get_user_history(uid)
+        db.get_user_history(uid, committed_only=True)
+        db.get_all_moods(uid)
+        db.get_recent_mood(uid)
+        db.load_user_context(uid)
+        db.get_dashboard_stats(uid)
+        db.get_trigger_rollup(uid)
+        for _ in db.iter_transactions(uid, committed_only=True):
+            pass
+        for _ in db.iter_moods(uid):
+            pass
+
+        with db.get_db_context(uid) as c:
+            yield [(s, [r[3] for r in c.execute("EXPLAIN QUERY PLAN " + s)])
+                   for s in statements if s.lstrip().upper().startswith("SELECT")]
+        db.close_db()
+
+
+def _bounded_sort(sql: str, plan: list[str]) -> bool:
+    # Sorting per-user rollup rows (one per category/day) or the union of two
+    # LIMITed id lists (load_user_context) never touches the full history
+    return "rollup_" in sql or any(step.startswith("LIST SUBQUERY") for step in plan)
+
+
+def test_hot_queries_use_indexes(traced_statements):
+    assert any("FROM transactions" in s for s, _ in traced_statements)
+    assert any("FROM moods" in s for s, _ in traced_statements)
+    for sql, plan in traced_statements:
+        if _bounded_sort(sql, plan):
+            continue
+        assert not any("TEMP B-TREE" in step for step in plan), (" ".join(sql.split()), plan)
+
+
+def test_user_filter_is_an_index_search(traced_statements):
+    for sql, plan in traced_statements:
+        if "FROM transactions" in sql or "FROM moods" in sql:
+            assert not any(step.startswith("SCAN transactions") or step.startswith("SCAN moods")
+                           for step in plan), (" ".join(sql.split()), plan)
@@ -0,0 +1,38 @@
+"""Moving a user between shard files can be rerun after a crash."""
+import sqlite3
+
+from app import database as db
+
+
+def _tx(i: int) -> dict:
+    return {"amount": 100.0 + i, "merchant": "m", "category": "food", "timestamp": f"2026-03-{i + 1:02d}T12:00:00",
+            "impulse_score": 40.0, "risk_level": "medium", "was_paused": 0, "was_overridden": 0,
+            "was_cancelled": 0, "notes": ""}
+
+
+def _state(user_id: str) -> tuple:
+    return (db.get_transaction_count(user_id), [t["amount"] for t in db.get_all_transactions(user_id)],
+            db.get_user_settings(user_id)["lock_duration"], db.get_data_version(user_id))
+
+
+def test_rerun_move_after_crash(fresh_db, monkeypatch):
+    monkeypatch.setattr(db, "DB_SHARDS", 1)
+    uid = next(u for u in (f"user{i}" for i in range(100)) if db.shard_path(u, 2) != db.DB_PATH)
+    db.insert_transactions_many(uid, [_tx(i) for i in range(5)])
+    db.update_user_settings(uid, {**db.get_user_settings(uid), "lock_duration": 45})
+    before = _state(uid)
+
+    # Crash after dst committed but before src did: the user is in both files
+    db.close_db()
+    snapshot = sqlite3.connect(":memory:")
+    with sqlite3.connect(db.DB_PATH) as src:
+        src.backup(snapshot)
+    db.reshard(2)
+    db.close_db()
+    with sqlite3.connect(db.DB_PATH) as src:
+        snapshot.backup(src)
+
+    assert db.reshard(2)["users_moved"] == 1
+    assert _state(uid) == before
+    with sqlite3.connect(db.DB_PATH) as src:
+        assert src.execute("SELECT COUNT(*) FROM transactions WHERE user_id=?", (uid,)).fetchone()[0] == 0
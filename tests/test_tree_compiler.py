@@ -0,0 +1,48 @@
+"""CompiledForest must reproduce sklearn's predict_proba bit for bit."""
+import pickle
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sklearn")
+
+from sklearn.ensemble import RandomForestClassifier  # noqa: E402
+
+from app.ml.tree_compiler import compile_forest  # noqa: E402
+
+
+def _data(seed: int, n: int = 2000):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack([
+        rng.integers(0, 24, n),                       # hour
+        rng.integers(0, 7, n),                        # weekday
+        np.round(rng.lognormal(6, 1.2, n), 2),       # amount
+        rng.choice([0.3, 0.4, 0.55, 0.7, 0.85], n),   # category risk
+    ]).astype(np.float64)
+    y = ((X[:, 0] >= 22) | (X[:, 2] * X[:, 3] > 900) | (rng.random(n) < 0.1)).astype(int)
+    return X, y
+
+
+@pytest.mark.parametrize("max_depth", [3, 5, None])
+def test_predictions_are_bit_identical(max_depth):
+    X, y = _data(max_depth or 0)
+    clf = RandomForestClassifier(n_estimators=50, max_depth=max_depth, random_state=42).fit(X, y)
+    forest = compile_forest(clf)
+    # Fresh rows plus exact split thresholds, where float32 rounding decides the branch
+    X_test, _ = _data(100 + (max_depth or 0))
+    splits = [(f, t) for e in clf.estimators_ for f, t in zip(e.tree_.feature, e.tree_.threshold) if f >= 0]
+    for i, (feature, threshold) in enumerate(splits[:len(X_test)]):
+        X_test[i, feature] = threshold
+
+    expected = clf.predict_proba(X_test)
+
+    assert np.array_equal(forest.predict_proba(X_test), expected)
+    assert all(forest.predict_proba_one(row) == expected[i].tolist() for i, row in enumerate(X_test.tolist()))
+
+
+def test_single_class_and_pickle_roundtrip():
+    X, _ = _data(7, n=200)
+    clf = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, np.zeros(len(X), dtype=int))
+    forest = pickle.loads(pickle.dumps(compile_forest(clf)))
+    assert np.array_equal(forest.predict_proba(X), clf.predict_proba(X))
+    assert forest.predict_proba_one(X[0]) == clf.predict_proba(X[:1])[0].tolist()
@@ -0,0 +1,32 @@
+"""Trigger map: rows without a usable time stay out of the time buckets."""
+from app import database as db
+from app.ml.history import UserHistory
+from app.ml.trigger_mapper import get_trigger_data, get_trigger_data_from_rollup
+
+ROWS = [
+    {"amount": 500.0, "category": "gaming", "timestamp": "garbage", "impulse_score": 80.0, "was_cancelled": 1},
+    {"amount": 120.0, "category": "food", "timestamp": "2026-03-07T23:30:00", "impulse_score": 60.0},
+    {"amount": 80.0, "category": "food", "timestamp": "2026-03-04T12:00:00", "impulse_score": 20.0},
+]
+
+
+def test_untimed_rows_skip_time_buckets():
+    data = get_trigger_data(ROWS)
+
+    assert sum(map(sum, data["heatmap"])) == 200
+    assert data["heatmap"][5][23] == 120 and data["heatmap"][6][23] == 0
+    assert "gaming" not in data["category_by_hour"]
+    assert dict(data["top_categories"])["gaming"] == 500
+    assert get_trigger_data(UserHistory.from_dicts(ROWS)) == data
+
+
+def test_list_and_rollup_paths_agree(fresh_db):
+    uid = "trig"
+    db.insert_transactions_many(uid, ({"merchant": "m", "risk_level": "low", "was_paused": 0,
+                                       "was_overridden": 0, "was_cancelled": 0, "notes": "", **t}
+                                      for t in ROWS))
+
+    from_rows = get_trigger_data(db.get_all_transactions(uid))
+    from_rollup = get_trigger_data_from_rollup(db.get_trigger_rollup(uid))
+
+    assert from_rows == from_rollup